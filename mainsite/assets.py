@@ -0,0 +1,196 @@
+"""
+Static files and uploads served by the outermost middleware(AssetsMiddleware), before the sessions,
+auth and the url resolver.
+
+A file is streamed by FileResponse, which the wsgi server hands to wsgi.file_wrapper(sendfile
+under gunicorn), with Last-Modified/ETag, 304 answers and single byte ranges. The .br/.gz copy
+made by collectstatic(storage.CompressedManifestStaticFilesStorage) is sent instead of the file when
+the client accepts it.
+
+Names that change with the content are cached by the browsers for a year without revalidation:
+the hashed static files, the uploads named by their sha1(storage.ContentHashStorage) with their
+variants, and any url with ?v=<content hash of the file> - media_url() adds it to the other
+uploads, the placeholders first of all. Every encoding of a file has an ETag of its own.
+"""
+import hashlib
+import mimetypes
+import os
+import re
+import stat
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.http import (FileResponse, HttpResponse, HttpResponseNotAllowed, HttpResponseNotFound,
+                         HttpResponseNotModified)
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+
+IMMUTABLE_RE = re.compile(r'(\.[0-9a-f]{12}\.\w+|(^|/)[0-9a-f]{40}(_\w+)?\.\w+)$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+ENCODINGS = (('br', '.br'), ('gzip', '.gz')) # by preference
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def is_immutable(name):
+    return bool(IMMUTABLE_RE.search(name))
+
+
+@lru_cache(maxsize=4096)
+def content_version(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def media_url(name, storage=default_storage):
+    """storage.url(name), with ?v=<content hash> unless the name already changes with the content."""
+    url = storage.url(name)
+    if is_immutable(name):
+        return url
+    try:
+        return '%s?v=%s' % (url, content_version(storage.path(name)))
+    except (OSError, NotImplementedError): # not there yet, or not a local storage
+        return url
+
+
+def find_static(path):
+    # collected files when there are, the apps' static/ directories otherwise(runserver, tests)
+    if settings.STATIC_ROOT:
+        full_path = safe_join(settings.STATIC_ROOT, path)
+        if os.path.isfile(full_path):
+            return full_path
+    return finders.find(path)
+
+
+def find_media(path):
+    return safe_join(settings.MEDIA_ROOT, path)
+
+
+class RangeFile:
+    """The part of an open file FileResponse streams for a range; no fileno, so no sendfile of all of it."""
+    def __init__(self, f, start, length):
+        f.seek(start)
+        self.file = f
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """(start, length) of a single 'bytes=' range, None to send the whole file, ValueError if unsatisfiable."""
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None # several ranges or garbage: the whole file is a valid answer too
+    first, last = match.groups()
+    if first == '': # the last N bytes
+        start = max(0, size - int(last))
+    else:
+        start = int(first)
+        if last != '' and int(last) < start:
+            return None
+    end = size - 1 if first == '' or last == '' else min(int(last), size - 1)
+    if start >= size:
+        raise ValueError
+    return start, end - start + 1
+
+
+def not_modified(request, etag, mtime):
+    if 'HTTP_IF_NONE_MATCH' in request.META:
+        return etag in [tag.strip() for tag in request.META['HTTP_IF_NONE_MATCH'].split(',')] or \
+            request.META['HTTP_IF_NONE_MATCH'].strip() == '*'
+    since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', '').split(';')[0])
+    return since is not None and int(mtime) <= since
+
+
+def versioned(request, full_path):
+    """?v= of media_url(), if it is the hash of this very file."""
+    return 'v' in request.GET and request.GET['v'] == content_version(full_path)
+
+
+def serve(request, name, full_path):
+    """The response for the file full_path, requested under the name name."""
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    try:
+        st = os.stat(full_path)
+    except (OSError, TypeError): # TypeError: not found by the finders
+        return HttpResponseNotFound()
+    if not stat.S_ISREG(st.st_mode):
+        return HttpResponseNotFound()
+
+    last_modified = http_date(st.st_mtime)
+    identity_etag = '"%x-%x"' % (int(st.st_mtime), st.st_size)
+    # ranges are of the file itself, never of the compressed copy
+    ranged = 'HTTP_RANGE' in request.META and \
+        request.META.get('HTTP_IF_RANGE', identity_etag) in (identity_etag, last_modified)
+    encodings = [(encoding, suffix) for encoding, suffix in ENCODINGS if os.path.isfile(full_path + suffix)]
+    accepted = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    encoding, suffix = next(((encoding, suffix) for encoding, suffix in encodings
+                             if encoding in accepted and not ranged), (None, ''))
+    headers = {
+        'Last-Modified': last_modified,
+        # every encoding is a representation of its own for the caches, so an ETag of its own
+        'ETag': '"%x-%x%s"' % (int(st.st_mtime), st.st_size, suffix.replace('.', '-')),
+        'Cache-Control': IMMUTABLE if is_immutable(name) or versioned(request, full_path) else
+        'public, max-age=%d' % settings.ASSETS_MAX_AGE,
+        'Accept-Ranges': 'bytes',
+    }
+    if encodings:
+        headers['Vary'] = 'Accept-Encoding'
+    if not_modified(request, headers['ETag'], st.st_mtime):
+        return with_headers(HttpResponseNotModified(), headers)
+
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    if ranged:
+        try:
+            part = parse_range(request.META['HTTP_RANGE'], st.st_size)
+        except ValueError:
+            return with_headers(HttpResponse(status=416), dict(headers, **{'Content-Range': 'bytes */%d' % st.st_size}))
+        if part is not None:
+            start, length = part
+            response = with_headers(FileResponse(RangeFile(open(full_path, 'rb'), start, length),
+                                                 status=206, content_type=content_type), headers)
+            response['Content-Range'] = 'bytes %d-%d/%d' % (start, start + length - 1, st.st_size)
+            response['Content-Length'] = length
+            return response
+
+    if encoding is not None:
+        headers['Content-Encoding'] = encoding
+        full_path += suffix
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type)
+        response['Content-Length'] = os.path.getsize(full_path)
+        return with_headers(response, headers)
+    # an explicit content_type, FileResponse would call a .gz application/gzip
+    return with_headers(FileResponse(open(full_path, 'rb'), content_type=content_type), headers)
+
+
+def with_headers(response, headers):
+    for key, value in headers.items():
+        response[key] = value
+    return response
+
+
+def find(path):
+    """(name, full path) of the file behind the url path, None if it is not an asset url."""
+    for prefix, finder in ((settings.STATIC_URL, find_static), (settings.MEDIA_URL, find_media)):
+        if prefix and path.startswith(prefix):
+            name = path[len(prefix):]
+            try:
+                return name, finder(name)
+            except SuspiciousFileOperation: # ../ out of the root
+                return name, None
+    return None
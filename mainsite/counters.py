@@ -0,0 +1,64 @@
+from django.core.cache import cache
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Account, Group, Post
+
+GROUP_COUNT_KEY = 'counters:groups'
+GROUP_COUNT_TIMEOUT = 60 * 60 # recount once an hour in case some change bypassed the signals
+
+
+def rebuild_group_count():
+    count = Group.objects.count()
+    cache.set(GROUP_COUNT_KEY, count, GROUP_COUNT_TIMEOUT)
+    return count
+
+
+def get_group_count():
+    count = cache.get(GROUP_COUNT_KEY)
+    if count is None:
+        count = rebuild_group_count()
+    return count
+
+
+def change_group_count(delta):
+    try:
+        cache.incr(GROUP_COUNT_KEY, delta)
+    except ValueError: # not cached yet(or expired) -> the table already has the change
+        rebuild_group_count()
+
+
+# ------------- Group.member_count, post_count, last_post_at ----------------
+# kept exact by the receivers in signals.py with F() updates, repair_group_counters() recounts them
+
+def change_member_count(group_pks, delta):
+    Group.objects.filter(pk__in=group_pks).update(member_count=F('member_count') + delta, updated_at=timezone.now())
+
+
+def post_added(post):
+    Group.objects.filter(pk=post.group_id).update(
+        post_count=F('post_count') + 1, last_post_at=post.date_pub, updated_at=timezone.now())
+
+
+def latest_post_date(): # of the group being updated, its creation time without posts
+    latest = Post.objects.filter(group=OuterRef('pk')).order_by('-date_pub').values('date_pub')[:1]
+    return Coalesce(Subquery(latest), F('date_create'))
+
+
+def post_removed(post): # after the delete, so the subquery finds the previous post
+    Group.objects.filter(pk=post.group_id).update(
+        post_count=F('post_count') - 1, last_post_at=latest_post_date(), updated_at=timezone.now())
+
+
+def _count(queryset):
+    counted = queryset.values('group_id').annotate(count=Count('*')).values('count')
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+def repair_group_counters():
+    """Recounts all groups with one UPDATE, returns the number of groups."""
+    members = Account.groups.through.objects.filter(group_id=OuterRef('pk')).order_by()
+    posts = Post.objects.filter(group_id=OuterRef('pk')).order_by()
+    return Group.objects.update(member_count=_count(members), post_count=_count(posts),
+                                last_post_at=latest_post_date())
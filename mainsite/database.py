@@ -0,0 +1,9 @@
+from django.conf import settings
+
+
+def configure_sqlite(sender, connection, **kwargs): # connection_created receiver
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute('PRAGMA %s = %s' % (name, value))
@@ -1,6 +1,7 @@
 ## -*- coding: utf-8 -*-
 from django import forms
 from .models import Account, Group, Post, Tag
+from .slugs import GROUP_SLUG_RE, canonical
 # from django.core.exceptions import ValidationError
 # from django.contrib.auth import authenticate
 from django.contrib.auth import get_user_model
@@ -33,10 +34,10 @@ class UserCreationForm(forms.ModelForm):
             'last_name': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Введите фамилию'}),
         }
     def clean_email(self):
-        email = self.cleaned_data.get("email")
-        if email and User.objects.filter(email__iexact=email).exists():
+        email = self.cleaned_data.get("email").lower() # stored in lowercase, see signals.lowercase_email
+        if email and User.objects.filter(email=email).exists():
             raise forms.ValidationError('Email должен быть уникальным!')
-        return email.lower()
+        return email
 
     def clean_password2(self):
         if self.cleaned_data.get("password1") != self.cleaned_data.get("password2"):
@@ -64,13 +65,8 @@ class UserEditForm(UserCreationForm):
         {'class': 'form-control', 'placeholder': 'Введите старый пароль'}), label=u'Ваш старый пароль', required=False)
 
     def clean_email(self):
-        user = self.instance
         email = self.cleaned_data.get("email").lower()
-        try:
-            exists_email = User.objects.get(email__iexact=email)
-        except:
-            return email
-        if exists_email != user:
+        if User.objects.filter(email=email).exclude(pk=self.instance.pk).exists():
             raise forms.ValidationError('Email должен быть уникальным!')
         return email
     
@@ -153,10 +149,12 @@ class GroupForm(forms.ModelForm):
         }
     
     def clean_slug(self):
-        slug = self.cleaned_data['slug']
-        if slug and (slug.lower() == 'create' or slug.lower() == 'list'):
+        slug = canonical(self.cleaned_data['slug']) # unique check below runs on the lowercase value
+        if slug == 'create' or slug == 'list':
             raise forms.ValidationError("Ссылка не может быть 'create', 'list' или 'delete!")
-        return slug
+        if GROUP_SLUG_RE.match(slug) and slug != self.instance.slug:
+            raise forms.ValidationError("Ссылки вида 'g-...' выдаются автоматически")
+        return slug or None
 
 class PostForm(forms.ModelForm):
     tags = forms.CharField(widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Введите тэги через запятую'}),
@@ -169,17 +167,10 @@ class PostForm(forms.ModelForm):
             'title': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Введите заголовок'}),
             'body': forms.Textarea(attrs={'class': 'form-control', 'placeholder': 'Содержание', 'rows': 10}),
         }
-    def save(self, *args, **kwargs): # FIXME: на спец символы не создаётся слаг и выдаётся ошибка уникальности
+    def save(self, *args, **kwargs):
         post = super().save(commit=False)
         post.author = kwargs.get('author')
         post.group = kwargs.get('group')
         post.save()
-        tags = list(map(lambda tag: tag.strip(), self.cleaned_data['tags'].split(',')))
-        print('tags:', tags)
-        for tag in tags:
-            if tag:
-                try:
-                    post.tags.add(Tag.objects.get(title__iexact=tag))
-                except Tag.DoesNotExist:
-                    post.tags.create(title=tag)
-        return post
\ No newline at end of file
+        post.add_tags(Tag.objects.resolve(self.cleaned_data['tags'].split(',')))
+        return post
@@ -0,0 +1,51 @@
+"""
+Cache for rendered pieces of pages(post cards, member strip, profile card).
+
+A fragment is keyed by its name plus pk and updated_at of every object it shows(or the value itself
+for anything without updated_at), so any change of those makes a new key and the old entry just expires. updated_at is bumped by
+save() itself and by the receivers in signals.py for changes that do not save the object
+(membership, tags, the user's name).
+"""
+import hashlib
+import threading
+from collections import defaultdict
+
+from django.core.cache import cache
+
+FRAGMENT_TIMEOUT = 60 * 60 * 24
+
+_lock = threading.Lock()
+_stats = defaultdict(lambda: {'hits': 0, 'misses': 0, 'render_seconds': 0.0})
+
+
+def fragment_key(name, objects):
+    flat = []
+    for obj in objects: # a list counts as its objects: the groups of the profile card
+        if isinstance(obj, (list, tuple)):
+            flat.extend(obj)
+        else:
+            flat.append(obj)
+    versions = ['%s.%d' % (obj.pk, obj.updated_at.timestamp() * 1000000) if hasattr(obj, 'updated_at') else
+                hashlib.md5(str(obj).encode()).hexdigest()[:12] for obj in flat] # names: no spaces in keys
+    return 'fragment:%s:%s' % (name, ':'.join(versions))
+
+
+def get_fragment(name, key):
+    content = cache.get(key)
+    if content is not None:
+        with _lock:
+            _stats[name]['hits'] += 1
+    return content
+
+
+def set_fragment(name, key, content, render_seconds):
+    cache.set(key, content, FRAGMENT_TIMEOUT)
+    with _lock:
+        _stats[name]['misses'] += 1
+        _stats[name]['render_seconds'] += render_seconds
+
+
+def fragment_stats():
+    """{name: {'hits', 'misses', 'render_seconds'}} of this process since start."""
+    with _lock:
+        return {name: dict(values) for name, values in _stats.items()}
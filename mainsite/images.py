@@ -0,0 +1,82 @@
+"""
+Resized copies of avatars and group photos.
+
+For every photo <name> there are variants/<name without ext>_<size>.webp and .jpg. They are
+built in a thread pool after the model is saved(signals.py), by the build_image_variants command
+for old files, and picked by the {% picture %} tag, which falls back to the original until the
+variants exist.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+SIZES = {
+    'thumb': (80, 80), # members strip, navbar, group list
+    'medium': (400, 400), # 200px avatars on retina screens
+}
+FORMATS = (('webp', 'WEBP', {'quality': 80, 'method': 4}),
+           ('jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}))
+
+logger = logging.getLogger(__name__)
+_executor = ThreadPoolExecutor(max_workers=getattr(settings, 'IMAGE_WORKERS', 2), thread_name_prefix='images')
+_existing = set() # variants known to exist, they never change for a given name
+
+
+def variant_name(name, size, ext):
+    return 'variants/%s_%s.%s' % (os.path.splitext(name)[0], size, ext)
+
+
+def variant_exists(name, storage=default_storage):
+    if name in _existing:
+        return True
+    if storage.exists(name):
+        _existing.add(name)
+        return True
+    return False
+
+
+def build_variants(name, storage=default_storage, rebuild=False):
+    """Creates the missing variants of the image(all of them with rebuild), returns how many were written."""
+    if rebuild:
+        for size in SIZES:
+            for ext, fmt, options in FORMATS:
+                storage.delete(variant_name(name, size, ext))
+                _existing.discard(variant_name(name, size, ext))
+    missing = [(size, ext, fmt, options) for size in SIZES for ext, fmt, options in FORMATS
+               if not variant_exists(variant_name(name, size, ext), storage)]
+    if not missing:
+        return 0
+    with storage.open(name) as original:
+        image = Image.open(original)
+        image = ImageOps.exif_transpose(image).convert('RGBA')
+    flat = Image.alpha_composite(Image.new('RGBA', image.size, 'white'), image).convert('RGB') # no alpha in jpeg
+    opaque = image.getextrema()[3][0] == 255
+    for size, ext, fmt, options in missing:
+        buffer = BytesIO()
+        source = image if fmt == 'WEBP' and not opaque else flat
+        ImageOps.fit(source, SIZES[size], Image.LANCZOS).save(buffer, fmt, **options)
+        target = variant_name(name, size, ext)
+        if storage.exists(target): # built by a concurrent task
+            continue
+        storage.save(target, ContentFile(buffer.getvalue()))
+        _existing.add(target)
+    return len(missing)
+
+
+def _build_logged(name):
+    try:
+        return build_variants(name)
+    except Exception:
+        logger.exception('Cannot build variants of %s', name)
+        return 0
+
+
+def schedule_variants(name):
+    """Builds the variants off the request path, returns a Future."""
+    return _executor.submit(_build_logged, name)
@@ -0,0 +1,44 @@
+"""
+Environment of the optional Jinja2 backend(JINJA2=1, see settings.py) for the hottest pages: the
+group feed, the post and the profile. The templates in jinja2/ mirror the django ones in templates/
+and get the same context from the views, these globals and filters stand in for the django tags.
+"""
+from time import perf_counter
+
+from django.templatetags.static import static
+from django.urls import reverse
+from django.utils import formats, timezone
+from django.utils.safestring import mark_safe
+from django.utils.text import capfirst
+from jinja2 import Environment
+
+from .fragments import fragment_key, get_fragment, set_fragment
+from .templatetags.images import picture
+
+
+def url(name, *args, **kwargs):
+    return reverse(name, args=args, kwargs=kwargs)
+
+
+def localize(value):
+    # what django does to every {{ value }}: local time, then the format of the language
+    return formats.localize(timezone.template_localtime(value))
+
+
+def fragment(name, *objects, caller):
+    """{% call fragment("post_card", post, post.author) %} ... {% endcall %}, see fragment_cache.py"""
+    name = 'jinja2.' + name # the markup differs from the django fragment of the same name
+    key = fragment_key(name, objects)
+    content = get_fragment(name, key)
+    if content is None:
+        start = perf_counter()
+        content = caller()
+        set_fragment(name, key, str(content), perf_counter() - start)
+    return mark_safe(content)
+
+
+def environment(**options):
+    env = Environment(**options)
+    env.globals.update({'url': url, 'static': static, 'picture': picture, 'fragment': fragment})
+    env.filters.update({'capfirst': capfirst, 'localize': localize})
+    return env
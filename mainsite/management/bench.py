@@ -0,0 +1,37 @@
+"""Helpers shared by the bench_* commands."""
+from time import perf_counter
+
+from django.db import connection
+from django.test import override_settings
+
+
+def percentile(timings, share):
+    """timings: sorted seconds; the value at the share(0..1) in milliseconds."""
+    return timings[min(len(timings) - 1, int(len(timings) * share))] * 1000
+
+
+def median_ms(func, repeat, before=None):
+    """Median ms of func() over repeat runs, before() runs ahead of every call and is not timed."""
+    timings = []
+    for _ in range(repeat):
+        if before:
+            before()
+        start = perf_counter()
+        func()
+        timings.append(perf_counter() - start)
+    return percentile(sorted(timings), 0.5)
+
+
+def record_queries(queries):
+    """with record_queries(queries): appends the sql of every query run inside to the list."""
+    # CaptureQueriesContext would lose them: request_started resets connection.queries
+    return connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args))
+
+
+def throwaway_cache():
+    """
+    A private locmem cache in place of the default one: what a run over a rolled back dataset puts
+    there(fragments, pages, cached users and counters) never reaches the shared cache.
+    """
+    return override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'bench'}})
@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client, override_settings
+
+from mainsite.management.bench import median_ms, record_queries
+from mainsite.middleware import forget_users
+from mainsite.models import Account, Group, Post
+
+DEFAULT_AUTH = 'django.contrib.auth.middleware.AuthenticationMiddleware'
+CACHED_AUTH = 'mainsite.middleware.CachedAuthenticationMiddleware'
+TIERS = {
+    'db': {'SESSION_ENGINE': 'django.contrib.sessions.backends.db', 'auth': DEFAULT_AUTH},
+    'cache': {'SESSION_ENGINE': 'django.contrib.sessions.backends.cached_db', 'auth': CACHED_AUTH},
+}
+
+
+def middleware(auth):
+    return [auth if name in (DEFAULT_AUTH, CACHED_AUTH) else name for name in settings.MIDDLEWARE]
+
+
+class Command(BaseCommand):
+    help = 'Queries and latency of signed in requests with sessions and request.user in the db and in the cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic(): # everything is rolled back
+            urls = self.prepare()
+            results = {name: self.measure(tier, urls, options['repeat']) for name, tier in TIERS.items()}
+            transaction.set_rollback(True)
+        forget_users([self.user.pk]) # its pk goes to the next real user
+        self.stdout.write('%-28s %10s %10s %10s %10s' % ('url', 'db q', 'cache q', 'db ms', 'cache ms'))
+        for url in urls:
+            (db_queries, db_ms), (cache_queries, cache_ms) = results['db'][url], results['cache'][url]
+            self.stdout.write('%-28s %10d %10d %10.2f %10.2f' % (url, db_queries, cache_queries, db_ms, cache_ms))
+
+    def prepare(self):
+        user = get_user_model().objects.create_user(username='bench-auth', password='secret')
+        account = Account.objects.create(user=user)
+        group = Group.objects.create(name='bench', slug='bench-auth')
+        account.groups.add(group)
+        post = Post.objects.create(title='bench', author=account, group=group, body='bench')
+        self.user = user
+        return ['/', '/profile/', '/group/list/', group.get_absolute_url(), post.get_absolute_url()]
+
+    def measure(self, tier, urls, repeat):
+        with override_settings(SESSION_ENGINE=tier['SESSION_ENGINE'], MIDDLEWARE=middleware(tier['auth'])):
+            client = Client()
+            client.force_login(self.user)
+            results = {}
+            for url in urls:
+                client.get(url) # fills the caches
+                queries = []
+                with record_queries(queries):
+                    client.get(url)
+                results[url] = (len(queries), median_ms(lambda: client.get(url), repeat))
+            return results
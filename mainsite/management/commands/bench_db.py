@@ -0,0 +1,105 @@
+import random
+import threading
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection
+
+from mainsite.models import Account, Group, Post
+from mainsite.timeline import TimelinePaginator
+
+PREFIX = 'bench-db-'
+
+
+class Command(BaseCommand):
+    help = ('Throughput of mixed read/write traffic(sign ups, joins, new posts, group list, feeds) '
+            'on the database of the current DB_PROFILE, from several threads at once')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 8])
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--writes', type=float, default=0.2, help='share of the write operations')
+
+    def handle(self, *args, **options):
+        self.stdout.write('profile: %s %s' % (connection.vendor, self.journal_mode()))
+        self.prepare()
+        try:
+            self.stdout.write('%8s %10s %10s %10s %8s' % ('threads', 'ops/s', 'reads/s', 'writes/s', 'errors'))
+            for threads in options['threads']:
+                reads, writes, errors = self.run(threads, options['seconds'], options['writes'])
+                self.stdout.write('%8d %10.1f %10.1f %10.1f %8d' % (
+                    threads, (reads + writes) / options['seconds'], reads / options['seconds'],
+                    writes / options['seconds'], errors))
+        finally: # the bench objects live in the real database, they can not be rolled back
+            get_user_model().objects.filter(username__startswith=PREFIX).delete()
+            Group.objects.filter(slug__startswith=PREFIX).delete()
+
+    def journal_mode(self):
+        if connection.vendor != 'sqlite':
+            return ''
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            return 'journal_mode=%s' % cursor.fetchone()[0]
+
+    def prepare(self):
+        self.groups = [Group.objects.create(name='bench %d' % i, slug='%s%d' % (PREFIX, i)) for i in range(10)]
+        self.sign_up('seed')
+
+    def sign_up(self, name):
+        user = get_user_model().objects.create_user(username=PREFIX + name, password=None)
+        return Account.objects.create(user=user)
+
+    def run(self, threads, seconds, write_share):
+        totals = {'reads': 0, 'writes': 0, 'errors': 0}
+        lock = threading.Lock()
+        deadline = perf_counter() + seconds
+
+        def worker(number):
+            rng = random.Random(number)
+            counts = {'reads': 0, 'writes': 0, 'errors': 0}
+            try:
+                account = self.sign_up('%d-%d' % (threads, number))
+                step = 0
+                while perf_counter() < deadline:
+                    step += 1
+                    try:
+                        if rng.random() < write_share:
+                            self.write(rng, account, '%d-%d-%d' % (threads, number, step))
+                            counts['writes'] += 1
+                        else:
+                            self.read(rng, account)
+                            counts['reads'] += 1
+                    except DatabaseError: # 'database is locked' and the like
+                        counts['errors'] += 1
+            finally:
+                connection.close() # every thread has its own connection
+                with lock:
+                    for key, value in counts.items():
+                        totals[key] += value
+
+        workers = [threading.Thread(target=worker, args=(number,)) for number in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return totals['reads'], totals['writes'], totals['errors']
+
+    def write(self, rng, account, name):
+        action = rng.randrange(3)
+        if action == 0:
+            self.sign_up(name)
+        elif action == 1:
+            group = rng.choice(self.groups)
+            account.groups.add(group) if rng.random() < 0.5 else account.groups.remove(group)
+        else:
+            Post.objects.create(title='bench', body='bench ' * 20, author=account, group=rng.choice(self.groups))
+
+    def read(self, rng, account):
+        action = rng.randrange(3)
+        if action == 0:
+            list(Group.objects.order_by('-member_count', '-id')[:5])
+        elif action == 1:
+            list(TimelinePaginator(account, 20).get_page())
+        else:
+            list(Post.objects.filter(group=rng.choice(self.groups)).cards().order_by('-date_pub', '-id')[:10])
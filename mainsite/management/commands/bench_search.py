@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from mainsite.management.bench import median_ms
+from mainsite.models import Group, Post
+from mainsite.search import get_backend, search
+
+
+def icontains_search(query):
+    # what a naive search would do: every word must be somewhere in the title/name or the text
+    posts, groups = Post.objects.all(), Group.objects.all()
+    for word in query.split():
+        posts = posts.filter(Q(title__icontains=word) | Q(body__icontains=word))
+        groups = groups.filter(Q(name__icontains=word) | Q(description__icontains=word))
+    return list(posts.values_list('pk', flat=True)) + list(groups.values_list('pk', flat=True))
+
+
+def timeit(func, query, repeat):
+    return len(func(query)), median_ms(lambda: func(query), repeat)
+
+
+class Command(BaseCommand):
+    help = 'Compare the search index with icontains scans on the current database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('queries', nargs='+')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        self.stdout.write('backend: %s, posts: %d, groups: %d' % (
+            type(get_backend()).__name__, Post.objects.count(), Group.objects.count()))
+        self.stdout.write('%-30s %18s %18s' % ('query', 'index (found, ms)', 'icontains (found, ms)'))
+        for query in options['queries']:
+            indexed = timeit(search, query, options['repeat'])
+            scanned = timeit(icontains_search, query, options['repeat'])
+            self.stdout.write('%-30s %8d %9.2f %8d %9.2f' % ((query,) + indexed + scanned))
@@ -0,0 +1,127 @@
+import json
+import logging
+import os
+import tracemalloc
+from io import StringIO
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client
+from django.urls import reverse
+
+from mainsite.management.bench import percentile, record_queries, throwaway_cache
+from mainsite.models import Account, Group, Post, Tag
+from mainsite.urls import urlpatterns
+
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, 'bench_baseline.json')
+SLACK = {'p95_ms': 5, 'peak_kb': 64} # absolute noise allowed on top of the tolerance
+RELOGIN = {'logout'} # these end the session, the client signs in again after each of them(not timed)
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of results against baseline: more queries, or latency/memory over the tolerance."""
+    regressions = []
+    for name, old in sorted(baseline.items()):
+        new = results.get(name)
+        if new is None:
+            continue
+        if new['queries'] > old['queries']:
+            regressions.append('%s: %d queries, baseline %d' % (name, new['queries'], old['queries']))
+        for key in ('p95_ms', 'peak_kb'):
+            if new[key] > old[key] * (1 + tolerance) + SLACK[key]:
+                regressions.append('%s: %s %.1f, baseline %.1f' % (name, key, new[key], old[key]))
+    return regressions
+
+
+class Command(BaseCommand):
+    help = ('Drive every url of mainsite/urls.py through the test client on a generated dataset, '
+            'report queries, latency percentiles and peak memory per url as JSON and compare them '
+            'with the baseline; a regression fails the run')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--accounts', type=int, default=200)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=2000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+        parser.add_argument('--save-baseline', action='store_true', help='write the results as the new baseline')
+        parser.add_argument('--tolerance', type=float, default=0.5,
+                            help='allowed growth of p95 and memory, 0.5 = +50%%; queries must not grow at all')
+        parser.add_argument('--output', help='file for the JSON results, stdout by default')
+
+    def handle(self, *args, **options):
+        # the dataset is rolled back, the cache entries built from it go with the throwaway cache
+        with throwaway_cache(), transaction.atomic():
+            call_command('generate_data', accounts=options['accounts'], groups=options['groups'],
+                         posts=options['posts'], prefix='bench-site-', stdout=StringIO())
+            urls = self.urls()
+            logging.disable(logging.WARNING) # 'Not Found: ...' of the 404 pages
+            try:
+                results = {name: self.measure(url, name in RELOGIN, options['repeat']) for name, url in urls}
+            finally:
+                logging.disable(logging.NOTSET)
+            transaction.set_rollback(True)
+
+        report = json.dumps(results, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(report)
+        else:
+            self.stdout.write(report)
+
+        if options['save_baseline']:
+            with open(options['baseline'], 'w') as f:
+                f.write(report)
+            self.stderr.write('baseline saved to %s' % options['baseline'])
+            return
+        if not os.path.exists(options['baseline']):
+            self.stderr.write('no baseline at %s, run with --save-baseline' % options['baseline'])
+            return
+        with open(options['baseline']) as f:
+            regressions = compare(results, json.load(f), options['tolerance'])
+        if regressions:
+            raise CommandError('regressions:\n' + '\n'.join(regressions))
+        self.stderr.write('no regressions against %s' % options['baseline'])
+
+    def urls(self):
+        """(name, url) of every named url of the site with the kwargs taken from the dataset."""
+        group = Group.objects.order_by('-member_count').first()
+        post = Post.objects.filter(group=group).order_by('-date_pub').first()
+        user = Account.objects.filter(groups=group).select_related('user').first().user
+        user.is_staff = True # for the staff pages
+        user.save()
+        self.user = user
+        tag = Tag.objects.filter(tagcount__group=None).order_by('-tagcount__count').first()
+        kwargs = {'slug': group.slug, 'postslug': post.slug, 'pk': user.pk, 'tagslug': tag.slug}
+        return [(pattern.name, reverse(pattern.name, kwargs={key: kwargs[key] for key in pattern.pattern.regex.groupindex}))
+                for pattern in urlpatterns]
+
+    def measure(self, url, relogin, repeat):
+        client = Client()
+        client.force_login(self.user)
+        queries = []
+
+        def request():
+            start = perf_counter()
+            response = client.get(url)
+            elapsed = perf_counter() - start
+            if relogin:
+                client.force_login(self.user)
+            return response, elapsed
+
+        request() # warm up: caches, templates
+        with record_queries(queries):
+            status = client.get(url).status_code
+        if relogin:
+            client.force_login(self.user)
+        tracemalloc.start()
+        request()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        timings = sorted(request()[1] for _ in range(repeat))
+        return {'url': url, 'status': status, 'queries': len(queries), 'peak_kb': round(peak / 1024, 1),
+                'p50_ms': round(percentile(timings, 0.5), 2), 'p95_ms': round(percentile(timings, 0.95), 2),
+                'p99_ms': round(percentile(timings, 0.99), 2)}
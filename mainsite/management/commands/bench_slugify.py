@@ -0,0 +1,45 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.utils.text import slugify as django_slugify
+
+from mainsite.management.bench import median_ms
+from utils import _cached_slugify, _slugify, slugify, slugify_many
+from .generate_data import WORDS
+
+OLD_ALPHABET = {'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo', 'ж': 'zh', 'з': 'z', 'и': 'i',
+                'й': 'j', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't',
+                'у': 'u', 'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shch', 'ы': 'i', 'э': 'e',
+                'ю': 'yu', 'я': 'ya'}
+
+
+def old_slugify(s): # utils.slugify before the translate table
+    return django_slugify(''.join(OLD_ALPHABET.get(w, w) for w in s.lower()), allow_unicode=True)
+
+
+class Command(BaseCommand):
+    help = 'utils.slugify against the old per-character version on tag titles, post titles and post bodies'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=20000)
+        parser.add_argument('--distinct', type=int, default=500, help='distinct tag titles among them')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        rng = random.Random(1)
+        tags = [('%s %s' % (rng.choice(WORDS), rng.choice(WORDS))).capitalize() for _ in range(options['distinct'])]
+        cases = (
+            ('tag titles', [rng.choice(tags) for _ in range(options['count'])]),
+            ('post titles', [' '.join(rng.choice(WORDS) for _ in range(6)) for _ in range(options['count'])]),
+            ('post bodies', [' '.join(rng.choice(WORDS) for _ in range(300)) for _ in range(options['count'] // 100)]),
+        )
+        self.stdout.write('%-12s %8s %10s %12s %12s %10s' % ('input', 'strings', 'old ms', 'new cold ms',
+                                                              'new lru ms', 'batch ms'))
+        fresh = (options['repeat'], _cached_slugify.cache_clear) # every run starts with an empty cache
+        for name, strings in cases:
+            old = median_ms(lambda: [old_slugify(s) for s in strings], *fresh)
+            cold = median_ms(lambda: [_slugify(s) for s in strings], *fresh) # no cache at all
+            lru = median_ms(lambda: [slugify(s) for s in strings], *fresh)
+            batch = median_ms(lambda: slugify_many(strings), *fresh)
+            self.stdout.write('%-12s %8d %10.1f %12.1f %12.1f %10.1f' % (name, len(strings), old, cold, lru, batch))
+
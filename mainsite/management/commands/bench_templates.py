@@ -0,0 +1,74 @@
+import os
+from io import StringIO
+from time import perf_counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.template.backends.django import DjangoTemplates
+from django.test import RequestFactory
+
+from mainsite.management.bench import median_ms
+from mainsite.models import Account, Group
+from mainsite.views import group_feed_context
+
+TEMPLATE = 'mainsite/group_info.html'
+LOADERS = ['django.template.loaders.filesystem.Loader', 'django.template.loaders.app_directories.Loader']
+
+
+def engines():
+    """(name, engine) of the django backend without and with the cached loader, and of jinja2 if installed."""
+    processors = settings.TEMPLATES[0]['OPTIONS']['context_processors']
+    django_params = {'DIRS': [os.path.join(settings.BASE_DIR, 'templates')], 'APP_DIRS': False}
+    found = [
+        ('django', DjangoTemplates(dict(django_params, NAME='django', OPTIONS={
+            'context_processors': processors, 'loaders': LOADERS}))),
+        ('django cached', DjangoTemplates(dict(django_params, NAME='django cached', OPTIONS={
+            'context_processors': processors, 'loaders': [('django.template.loaders.cached.Loader', LOADERS)]}))),
+    ]
+    try:
+        from django.template.backends.jinja2 import Jinja2
+    except ImportError: # jinja2 is optional
+        return found
+    found.append(('jinja2', Jinja2({'NAME': 'jinja2', 'DIRS': [os.path.join(settings.BASE_DIR, 'jinja2')],
+                                    'APP_DIRS': False, 'OPTIONS': {
+                                        'environment': 'mainsite.jinja2.environment',
+                                        'context_processors': ["my_context_processors.menu.main"]}})))
+    return found
+
+
+class Command(BaseCommand):
+    help = ('Render time of a large group feed(%s) with the django templates without and with the '
+            'cached loader and with jinja2, the fragment cache empty(cold) and filled(warm)' % TEMPLATE)
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100, help='on the page')
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        with transaction.atomic(): # the dataset is rolled back
+            call_command('generate_data', accounts=50, groups=1, posts=options['posts'], prefix='bench-templates-',
+                         stdout=StringIO())
+            group = Group.objects.get(pk=Account.objects.filter(user__username='bench-templates-0')
+                                      .values_list('groups', flat=True).first())
+            request = RequestFactory().get(group.get_absolute_url())
+            request.user = Account.objects.filter(groups=group).select_related('user').first().user
+            context = dict(group_feed_context(request, group, options['posts']), object=group, group=group)
+            context['posts'] = list(context['posts']) # the queries are not measured
+            self.stdout.write('%14s %10s %10s %10s %8s' % ('engine', 'first ms', 'cold ms', 'warm ms', 'KB'))
+            for name, engine in engines():
+                start = perf_counter()
+                cache.clear()
+                html = engine.get_template(TEMPLATE).render(dict(context), request) # loads and compiles
+                first = perf_counter() - start
+                cold = median_ms(lambda: engine.get_template(TEMPLATE).render(dict(context), request),
+                                 options['repeat'], cache.clear)
+                warm = median_ms(lambda: engine.get_template(TEMPLATE).render(dict(context), request),
+                                 options['repeat'])
+                self.stdout.write('%14s %10.2f %10.2f %10.2f %8.1f' % (name, first * 1000, cold, warm,
+                                                                      len(html.encode()) / 1024))
+            transaction.set_rollback(True)
+        cache.clear()
+
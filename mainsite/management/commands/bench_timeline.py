@@ -0,0 +1,53 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from mainsite.management.bench import median_ms
+from mainsite.models import Account, Group, Post, TimelineEntry
+from mainsite.timeline import TimelinePaginator
+
+
+class Command(BaseCommand):
+    help = 'Timeline latency against the naive IN (...) query as the number of groups and posts grows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--groups', type=int, nargs='+', default=[5, 20, 100])
+        parser.add_argument('--posts', type=int, nargs='+', default=[20, 200])
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        self.stdout.write('%8s %8s %10s %12s %12s' % ('groups', 'posts', 'naive ms', 'timeline ms', 'page 10 ms'))
+        for groups in options['groups']:
+            for posts in options['posts']:
+                with transaction.atomic(): # everything is rolled back
+                    self.stdout.write('%8d %8d %10.2f %12.2f %12.2f' % (
+                        (groups, groups * posts) + self.measure(groups, posts, options['repeat'])))
+                    transaction.set_rollback(True)
+
+    def measure(self, group_count, posts_per_group, repeat):
+        user = get_user_model().objects.create(username='bench-reader')
+        account = Account.objects.create(user=user)
+        groups = Group.objects.bulk_create(Group(name='g%d' % i, slug='bench-g%d' % i) for i in range(group_count))
+        groups = list(Group.objects.filter(slug__startswith='bench-g')) # pks for every backend
+        account.groups.add(*groups)
+        Post.objects.bulk_create(
+            (Post(title='p', slug='bench-%d-%d' % (group.pk, i), author=account, group=group)
+             for group in groups for i in range(posts_per_group)), batch_size=500)
+        TimelineEntry.objects.bulk_create(
+            (TimelineEntry(account=account, post_id=pk, group_id=group_id, date_pub=date_pub)
+             for pk, group_id, date_pub in Post.objects.filter(group__in=groups).values_list('pk', 'group_id', 'date_pub')),
+            batch_size=500)
+
+        def naive():
+            list(Post.objects.filter(group__in=account.groups.all()).cards().order_by('-date_pub', '-id')[:20])
+
+        paginator = TimelinePaginator(account, 20)
+        first = paginator.get_page()
+        deep = first
+        for _ in range(9):
+            if deep.has_next():
+                deep = paginator.get_page(after=deep.next_cursor())
+        cursor = deep.next_cursor() if deep.has_next() else None
+        return (median_ms(naive, repeat),
+                median_ms(lambda: paginator.get_page(), repeat),
+                median_ms(lambda: paginator.get_page(after=cursor), repeat))
@@ -0,0 +1,96 @@
+import threading
+import urllib.request
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler, WSGIServer
+from django.core.wsgi import get_wsgi_application
+from django.test import Client
+
+from mainsite.management.bench import percentile
+from mainsite.models import Account, Group, Post
+
+PREFIX = 'bench-wsgi-'
+SERVERS = {'single': WSGIServer, 'threaded': ThreadedWSGIServer}
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = ('Requests per second and p50/p99 latency of the read pages(main, group list, group, post, '
+            'profile) under concurrent clients, served by vkommune.wsgi one request at a time and '
+            'with a thread per request')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, nargs='+', default=[1, 8, 32])
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--posts', type=int, default=200)
+
+    def handle(self, *args, **options):
+        urls = self.prepare(options['posts'])
+        try:
+            self.stdout.write('%9s %8s %8s %8s %8s %7s' % ('server', 'clients', 'rps', 'p50 ms', 'p99 ms', 'errors'))
+            for name, server_class in SERVERS.items():
+                for clients in options['clients']:
+                    rps, p50, p99, errors = self.run(server_class, urls, clients, options['seconds'])
+                    self.stdout.write('%9s %8d %8.1f %8.2f %8.2f %7d' % (name, clients, rps, p50, p99, errors))
+        finally: # served by other threads, so the dataset can not live in a rolled back transaction
+            get_user_model().objects.filter(username__startswith=PREFIX).delete()
+            Group.objects.filter(slug__startswith=PREFIX).delete()
+
+    def prepare(self, post_count):
+        user = get_user_model().objects.create_user(username=PREFIX + 'reader', password=None)
+        account = Account.objects.create(user=user)
+        groups = [Group.objects.create(name='bench %d' % i, slug='%s%d' % (PREFIX, i)) for i in range(5)]
+        account.groups.add(*groups)
+        posts = [Post.objects.create(title='bench %d' % i, body='bench ' * 50, author=account, group=groups[i % 5])
+                 for i in range(post_count)]
+        client = Client()
+        client.force_login(user) # signed in: the pages are rendered, not taken from the page cache
+        self.cookie = '%s=%s' % (settings.SESSION_COOKIE_NAME, client.cookies[settings.SESSION_COOKIE_NAME].value)
+        return ['/', '/group/list/', groups[0].get_absolute_url(), posts[-1].get_absolute_url(), '/profile/']
+
+    def run(self, server_class, urls, clients, seconds):
+        server = server_class(('127.0.0.1', 0), QuietHandler)
+        server.set_app(get_wsgi_application())
+        serving = threading.Thread(target=server.serve_forever, daemon=True)
+        serving.start()
+        base = 'http://127.0.0.1:%d' % server.server_address[1]
+        timings, errors, lock = [], [0], threading.Lock()
+        deadline = perf_counter() + seconds
+
+        def client(number):
+            own, failed, step = [], 0, number
+            while perf_counter() < deadline:
+                request = urllib.request.Request(base + urls[step % len(urls)], headers={'Cookie': self.cookie})
+                step += 1
+                start = perf_counter()
+                try:
+                    with urllib.request.urlopen(request, timeout=30) as response:
+                        response.read()
+                except OSError:
+                    failed += 1
+                    continue
+                own.append(perf_counter() - start)
+            with lock:
+                timings.extend(own)
+                errors[0] += failed
+
+        started = perf_counter()
+        workers = [threading.Thread(target=client, args=(number,)) for number in range(clients)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = perf_counter() - started
+        server.shutdown()
+        server.server_close()
+        timings.sort()
+        if not timings:
+            return 0.0, 0.0, 0.0, errors[0]
+        return len(timings) / elapsed, percentile(timings, 0.5), percentile(timings, 0.99), errors[0]
@@ -0,0 +1,40 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from mainsite.images import build_variants
+from mainsite.models import Account, Group
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp')
+
+
+def media_images(*directories):
+    for directory in directories:
+        for root, dirs, files in os.walk(os.path.join(settings.MEDIA_ROOT, directory)):
+            for filename in files:
+                if filename.lower().endswith(IMAGE_EXTENSIONS):
+                    yield os.path.relpath(os.path.join(root, filename), settings.MEDIA_ROOT).replace('\\', '/')
+
+
+class Command(BaseCommand):
+    help = 'Build the resized variants of the placeholders and of everything in uploads/users and uploads/groups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+        parser.add_argument('--rebuild', action='store_true', help='replace the existing variants too')
+
+    def handle(self, *args, **options):
+        names = {Account._meta.get_field('photo').default, Group._meta.get_field('photo').default}
+        names.update(media_images('users', 'groups'))
+        built = failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            futures = {name: executor.submit(build_variants, name, rebuild=options['rebuild']) for name in sorted(names)}
+            for name, future in futures.items():
+                try:
+                    built += future.result()
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write('%s: %s' % (name, exc))
+        self.stdout.write('images: %d, variants built: %d, failed: %d' % (len(names), built, failed))
@@ -0,0 +1,22 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from mainsite.transfer import TYPES, export
+
+
+class Command(BaseCommand):
+    help = 'Stream accounts, groups, tags, memberships and posts as JSONL(see mainsite/transfer.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='file, stdout by default')
+        parser.add_argument('--types', nargs='+', choices=TYPES, default=TYPES)
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as out:
+                count = export(out, options['types'], options['chunk_size'])
+        else:
+            count = export(sys.stdout, options['types'], options['chunk_size'])
+        self.stderr.write('exported %d objects' % count)
@@ -0,0 +1,127 @@
+import random
+from datetime import timedelta
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import Truncator
+
+from utils import slugify
+from mainsite.models import Account, Group, Post, PostTag, Tag
+from mainsite.slugs import group_slugs, post_slugs
+from mainsite.transfer import pks_by, rebuild_derived
+
+WORDS = ('профсоюз', 'рабочие', 'завод', 'зарплата', 'смена', 'цех', 'собрание', 'забастовка', 'договор',
+         'отпуск', 'премия', 'охрана', 'труда', 'город', 'район', 'школа', 'учителя', 'врачи', 'больница',
+         'транспорт', 'водители', 'студенты', 'общежитие', 'стипендия', 'жильё', 'аренда', 'тариф', 'митинг',
+         'листовка', 'газета', 'новости', 'встреча', 'солидарность', 'требования', 'переговоры', 'суд',
+         'юрист', 'помощь', 'касса', 'взносы', 'выборы', 'совет', 'комитет', 'план', 'отчёт', 'итоги')
+BATCH = 500
+
+
+def sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def weighted(rng, items, weights, count):
+    # popular groups get more members and posts, like on a real site
+    return rng.choices(items, weights=weights, k=count)
+
+
+class Command(BaseCommand):
+    help = ('Fill the database with synthetic accounts, groups, tags, memberships and posts with '
+            'Cyrillic titles, then recount the counters, the timelines and the search index')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--accounts', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--tags', type=int, default=200)
+        parser.add_argument('--memberships', type=int, default=5, help='groups per account on average')
+        parser.add_argument('--days', type=int, default=90, help='posts are spread over the last days')
+        parser.add_argument('--prefix', default='gen', help='of the usernames, must not be taken yet')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        started = perf_counter()
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            accounts = self.create_accounts(options['prefix'], options['accounts'])
+            groups = self.create_groups(rng, options['groups'])
+            tags = self.create_tags(rng, options['tags'])
+            members = self.create_memberships(rng, accounts, groups, options['memberships'])
+            posts = self.create_posts(rng, accounts, groups, members, options['posts'], options['days'])
+            self.tag_posts(rng, posts, tags)
+        rebuild_derived()
+        self.stdout.write('%d accounts, %d groups, %d tags, %d memberships, %d posts in %.1fs' % (
+            len(accounts), len(groups), len(tags), sum(len(ids) for ids in members.values()),
+            len(posts), perf_counter() - started))
+
+    def create_accounts(self, prefix, count):
+        password = make_password('secret') # hashing is slow, every account gets the same hash
+        usernames = ['%s%d' % (prefix, i) for i in range(count)]
+        User = get_user_model()
+        User.objects.bulk_create((User(username=name, first_name=name, password=password) for name in usernames),
+                                 batch_size=BATCH)
+        user_pks = pks_by(User.objects.all(), 'username', usernames)
+        Account.objects.bulk_create((Account(user_id=user_pks[name]) for name in usernames), batch_size=BATCH)
+        return list(pks_by(Account.objects.all(), 'user_id', list(user_pks.values())).values())
+
+    def create_groups(self, rng, count):
+        slugs = group_slugs(count)
+        Group.objects.bulk_create(
+            (Group(name=sentence(rng, 2), slug=slug, description=sentence(rng, 12)) for slug in slugs),
+            batch_size=BATCH)
+        pks = pks_by(Group.objects.all(), 'slug', slugs)
+        return [pks[slug] for slug in slugs]
+
+    def create_tags(self, rng, count):
+        titles = {}
+        while len(titles) < count and len(titles) < len(WORDS) ** 2:
+            title = '%s %s' % (rng.choice(WORDS), rng.choice(WORDS))
+            titles.setdefault(slugify(title)[:50], title)
+        Tag.objects.bulk_create((Tag(title=title, slug=slug) for slug, title in titles.items()),
+                                batch_size=BATCH, ignore_conflicts=True)
+        return list(pks_by(Tag.objects.all(), 'slug', list(titles)).values())
+
+    def create_memberships(self, rng, accounts, groups, per_account):
+        weights = [1 / (rank + 1) for rank in range(len(groups))]
+        members = {}
+        rows = []
+        for account_id in accounts:
+            count = min(len(groups), max(1, int(rng.expovariate(1 / per_account))))
+            for group_id in set(weighted(rng, groups, weights, count)):
+                members.setdefault(group_id, []).append(account_id)
+                rows.append(Account.groups.through(account_id=account_id, group_id=group_id))
+        Account.groups.through.objects.bulk_create(rows, batch_size=BATCH, ignore_conflicts=True)
+        return members
+
+    def create_posts(self, rng, accounts, groups, members, count, days):
+        weights = [1 / (rank + 1) for rank in range(len(groups))]
+        now = timezone.now()
+        posts = []
+        for group_id in weighted(rng, groups, weights, count):
+            body = '\n\n'.join(sentence(rng, rng.randint(8, 30)) + '.' for _ in range(rng.randint(1, 4)))
+            posts.append(Post(title=sentence(rng, rng.randint(2, 6)), body=body, excerpt=Truncator(body).chars(700),
+                              body_html=Post.render_body(body), group_id=group_id,
+                              author_id=rng.choice(members.get(group_id) or accounts)))
+        for post, slug in zip(posts, post_slugs([post.title for post in posts])):
+            post.slug = slug
+        Post.objects.bulk_create(posts, batch_size=BATCH)
+        pks = pks_by(Post.objects.all(), 'slug', [post.slug for post in posts])
+        for post in posts: # auto_now_add has set every date_pub to now
+            post.pk = pks[post.slug]
+            post.date_pub = now - timedelta(seconds=rng.randint(0, days * 24 * 60 * 60))
+        Post.objects.bulk_update(posts, ['date_pub'], batch_size=BATCH)
+        return posts
+
+    def tag_posts(self, rng, posts, tags):
+        if not tags:
+            return
+        PostTag.objects.bulk_create(
+            (PostTag(post_id=post.pk, tag_id=tag_id, date_pub=post.date_pub)
+             for post in posts for tag_id in set(rng.sample(tags, min(len(tags), rng.randint(0, 3))))),
+            batch_size=BATCH, ignore_conflicts=True)
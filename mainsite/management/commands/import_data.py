@@ -0,0 +1,29 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from mainsite.transfer import import_lines, rebuild_derived
+
+
+class Command(BaseCommand):
+    help = 'Import a JSONL file of export_data in chunks, one transaction per chunk, resumable with --offset'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--offset', type=int, default=0, help='lines already imported, printed after each chunk')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--source', help='name of the export to remember the imported objects under, '
+                                             'the file name by default; give the same one to resume')
+        parser.add_argument('--no-rebuild', action='store_true',
+                            help="don't recount the counters, timelines and the search index at the end")
+
+    def handle(self, *args, **options):
+        def progress(offset):
+            self.stdout.write('committed, --offset %d' % offset)
+
+        with open(options['path'], encoding='utf-8') as lines:
+            total = import_lines(lines, options['source'] or os.path.basename(options['path']), options['offset'],
+                                 options['chunk_size'], progress)
+        if not options['no_rebuild']:
+            rebuild_derived()
+        self.stdout.write('imported lines %d-%d' % (options['offset'] + 1, total))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from mainsite.counters import rebuild_group_count
+
+
+class Command(BaseCommand):
+    help = 'Recount groups from the table and store the result in the cache'
+
+    def handle(self, *args, **options):
+        count = rebuild_group_count()
+        self.stdout.write('groups: %d' % count)
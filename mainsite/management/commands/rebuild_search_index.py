@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from mainsite.search import get_backend, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index of posts and groups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        count = rebuild_index(chunk_size=options['chunk_size'])
+        self.stdout.write('%s: indexed %d objects' % (type(get_backend()).__name__, count))
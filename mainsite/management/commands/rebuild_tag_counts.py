@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from mainsite.tags import rebuild_tag_counts
+
+
+class Command(BaseCommand):
+    help = 'Recount the posts per tag of every group and of the site(TagCount) and copy the post dates into PostTag'
+
+    def handle(self, *args, **options):
+        self.stdout.write('tag counts: %d' % rebuild_tag_counts())
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from mainsite.counters import rebuild_group_count, repair_group_counters
+
+
+class Command(BaseCommand):
+    help = 'Recount members, posts and the last post date of every group'
+
+    def handle(self, *args, **options):
+        groups = repair_group_counters()
+        rebuild_group_count()
+        self.stdout.write('groups repaired: %d' % groups)
@@ -0,0 +1,57 @@
+"""
+Members of a group and groups of an account, a page at a time.
+
+The group header and the profile card show only the newest PREVIEW rows of Account.groups.through
+(inside their cached fragments), the rest comes from the members endpoints as the user scrolls:
+keyset pages over the same table by its id, newest first, as an HTML fragment for
+static/js/lazy_list.js or as JSON with ?format=json. Every page is one query with the accounts(or
+groups) joined in, over the (group_id, id)/(account_id, id) indexes of migration 0007.
+"""
+from collections import namedtuple
+
+from django.conf import settings
+from django.http import Http404
+from django.urls import reverse
+
+from .models import Account
+
+PREVIEW = getattr(settings, 'MEMBERS_PREVIEW', 12)
+PAGE = getattr(settings, 'MEMBERS_PAGE', 48)
+
+Membership = Account.groups.through
+Page = namedtuple('Page', 'objects next')
+
+
+def member_rows(group): # only what the avatar card shows
+    return Membership.objects.filter(group=group).select_related('account__user').only(
+        'account', 'account__photo', 'account__user', 'account__user__first_name')
+
+
+def group_rows(account):
+    return Membership.objects.filter(account=account).select_related('group').only(
+        'group', 'group__name', 'group__slug', 'group__updated_at') # updated_at: the key of the profile card
+
+
+def keyset(rows, after, size):
+    """(rows of the page, id to pass as ?after= for the next one or None), the newest first."""
+    if after:
+        try:
+            rows = rows.filter(pk__lt=int(after))
+        except ValueError:
+            raise Http404(u"Invalid cursor.")
+    rows = list(rows.order_by('-pk')[:size + 1])
+    return rows[:size], rows[size - 1].pk if len(rows) > size else None
+
+
+def next_url(name, kwargs, cursor):
+    return '%s?after=%d' % (reverse(name, kwargs=kwargs), cursor) if cursor else None
+
+
+def members_page(group, after=None, size=None):
+    rows, cursor = keyset(member_rows(group), after, size or PAGE)
+    return Page([row.account for row in rows], next_url('group_members', {'slug': group.slug}, cursor))
+
+
+def groups_page(account, after=None, size=None):
+    rows, cursor = keyset(group_rows(account), after, size or PAGE)
+    return Page([row.group for row in rows], next_url('profile_groups', {'pk': account.user_id}, cursor))
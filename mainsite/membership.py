@@ -0,0 +1,37 @@
+"""
+Is the user a member of the group - without loading all groups of the user or all members of
+the group. Single checks are one EXISTS over the unique (account_id, group_id) index of the
+Account.groups table, answers are memoized on the request.
+"""
+from .models import Account
+
+Membership = Account.groups.through
+
+
+def _memo(request):
+    if not hasattr(request, '_membership'):
+        request._membership = {}
+    return request._membership
+
+
+def group_ids(request):
+    """Set of ids of the user's groups, one query per request."""
+    memo = _memo(request)
+    if 'all' not in memo:
+        if request.user.is_authenticated:
+            memo['all'] = set(Membership.objects.filter(account__user_id=request.user.pk)
+                              .values_list('group_id', flat=True))
+        else:
+            memo['all'] = set()
+    return memo['all']
+
+
+def is_member(request, group):
+    if not request.user.is_authenticated:
+        return False
+    memo = _memo(request)
+    if 'all' in memo:
+        return group.pk in memo['all']
+    if group.pk not in memo:
+        memo[group.pk] = Membership.objects.filter(account__user_id=request.user.pk, group_id=group.pk).exists()
+    return memo[group.pk]
@@ -0,0 +1,129 @@
+"""
+Cost of every view: wall time, SQL queries(count, time, repeats) and template time per request.
+
+MetricsMiddleware(see middleware.py) collects a RequestStats for the sampled requests, sends it
+back in the Server-Timing header and adds it to histograms per url name, served by /metrics in
+the Prometheus text format. Settings: METRICS_ENABLED(off -> the middleware drops out of the
+chain, nothing is measured), METRICS_SAMPLE_RATE(0..1) and METRICS_SERVER_TIMING.
+
+A query is repeated when the same SQL runs again in the request with any parameters - the
+N+1 signature, e.g. one query per post of a list.
+"""
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from time import perf_counter
+
+from django.template.backends.django import DjangoTemplates, Template
+
+SECONDS_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+HISTOGRAMS = ( # name, help, buckets, RequestStats attribute
+    ('request_duration_seconds', 'Wall time of the request', SECONDS_BUCKETS, 'duration'),
+    ('db_queries', 'SQL queries per request', COUNT_BUCKETS, 'queries'),
+    ('db_duration_seconds', 'Time spent in SQL queries per request', SECONDS_BUCKETS, 'sql_duration'),
+    ('db_repeated_queries', 'Queries per request that repeat an earlier SQL of the request', COUNT_BUCKETS, 'repeated'),
+    ('template_duration_seconds', 'Template render time per request', SECONDS_BUCKETS, 'template_duration'),
+)
+PREFIX = 'vkommune_'
+
+_lock = threading.Lock()
+_histograms = defaultdict(lambda: {name: [[0] * (len(buckets) + 1), 0.0] for name, _, buckets, _ in HISTOGRAMS})
+_local = threading.local() # RequestStats of the request this thread serves, if it is sampled
+
+
+class RequestStats:
+    def __init__(self):
+        self.started = perf_counter()
+        self.duration = 0.0
+        self.sql_duration = 0.0
+        self.template_duration = 0.0
+        self.statements = Counter()
+
+    @property
+    def queries(self):
+        return sum(self.statements.values())
+
+    @property
+    def repeated(self):
+        return self.queries - len(self.statements)
+
+    def execute_wrapper(self, execute, sql, params, many, context): # connection.execute_wrapper()
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_duration += perf_counter() - start
+            self.statements[sql] += 1
+
+    def server_timing(self):
+        return 'db;dur=%.1f;desc="%d queries, %d repeated", tpl;dur=%.1f, total;dur=%.1f' % (
+            self.sql_duration * 1000, self.queries, self.repeated, self.template_duration * 1000, self.duration * 1000)
+
+
+def start_request():
+    _local.stats = RequestStats()
+    return _local.stats
+
+
+def finish_request(stats, view):
+    _local.stats = None
+    stats.duration = perf_counter() - stats.started
+    with _lock:
+        histograms = _histograms[view]
+        for name, _, buckets, attribute in HISTOGRAMS:
+            value = getattr(stats, attribute)
+            histograms[name][0][bisect_left(buckets, value)] += 1
+            histograms[name][1] += value
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        stats = getattr(_local, 'stats', None)
+        if stats is None:
+            return super().render(context, request)
+        start = perf_counter()
+        try:
+            return super().render(context, request)
+        finally: # only the top level templates come here, {% include %} is inside their time
+            stats.template_duration += perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The django template backend with its render time counted into the current RequestStats."""
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+def _labels(view, le=None):
+    labels = 'view="%s"' % view.replace('\\', '\\\\').replace('"', '\\"')
+    return '{%s,le="%s"}' % (labels, le) if le is not None else '{%s}' % labels
+
+
+def render_prometheus():
+    """All histograms in the Prometheus text exposition format."""
+    with _lock:
+        snapshot = {view: {name: (list(counts), total) for name, (counts, total) in histograms.items()}
+                    for view, histograms in _histograms.items()}
+    lines = []
+    for name, help_text, buckets, _ in HISTOGRAMS:
+        lines.append('# HELP %s%s %s' % (PREFIX, name, help_text))
+        lines.append('# TYPE %s%s histogram' % (PREFIX, name))
+        for view in sorted(snapshot):
+            counts, total = snapshot[view][name]
+            cumulative = 0
+            for bound, count in zip(buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append('%s%s_bucket%s %d' % (PREFIX, name, _labels(view, bound), cumulative))
+            lines.append('%s%s_sum%s %r' % (PREFIX, name, _labels(view), total))
+            lines.append('%s%s_count%s %d' % (PREFIX, name, _labels(view), cumulative))
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
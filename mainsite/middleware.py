@@ -0,0 +1,111 @@
+"""
+Cache tier for authenticated requests(switched on by CACHE_TIER=1, see settings.py).
+
+CachedAuthenticationMiddleware takes the place of django's AuthenticationMiddleware: request.user
+is loaded with its Account in one select_related query and kept in the cache, so a signed in
+request normally reads neither auth_user nor mainsite_account. The session hash is still checked
+on every request, so a password change logs out the other sessions as before. The receivers in
+signals.py call forget_users() whenever a user or an account changes.
+
+MetricsMiddleware measures every(or every sampled) request, see metrics.py.
+
+AssetsMiddleware answers /static/ and /uploads/ before all the others, see assets.py.
+"""
+import random
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+from . import assets, metrics
+
+USER_TIMEOUT = 60 * 30
+
+
+def user_key(user_id):
+    return 'auth:user:%s' % user_id
+
+
+def forget_users(user_ids):
+    cache.delete_many([user_key(user_id) for user_id in user_ids])
+
+
+def load_user(user_id):
+    user = cache.get(user_key(user_id))
+    if user is None:
+        user = auth.get_user_model().objects.select_related('account').filter(pk=user_id).first()
+        if user is not None:
+            cache.set(user_key(user_id), user, USER_TIMEOUT)
+    return user
+
+
+def get_user(request):
+    # django.contrib.auth.get_user() with the cached user instead of backend.get_user()
+    try:
+        user_id = auth._get_user_session_key(request)
+        backend_path = request.session[auth.BACKEND_SESSION_KEY]
+    except KeyError:
+        return AnonymousUser()
+    if backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return AnonymousUser()
+    user = load_user(user_id)
+    if user is None or not user.is_active:
+        return AnonymousUser()
+    session_hash = request.session.get(auth.HASH_SESSION_KEY)
+    if not (session_hash and constant_time_compare(session_hash, user.get_session_auth_hash())):
+        request.session.flush()
+        return AnonymousUser()
+    return user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware): # a subclass for the admin checks
+    def process_request(self, request):
+        request.user = SimpleLazyObject(lambda: get_user(request))
+
+
+class MetricsMiddleware:
+    """Outermost middleware, see metrics.py."""
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'METRICS_SAMPLE_RATE', 1.0)
+        self.server_timing = getattr(settings, 'METRICS_SERVER_TIMING', True)
+
+    def __call__(self, request):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+        stats = metrics.start_request()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats.execute_wrapper))
+                response = self.get_response(request)
+        finally:
+            match = getattr(request, 'resolver_match', None)
+            metrics.finish_request(stats, match.url_name or match.view_name if match else 'unresolved')
+        if self.server_timing:
+            response['Server-Timing'] = stats.server_timing()
+        return response
+
+
+class AssetsMiddleware:
+    """Outermost middleware, drops out with SERVE_ASSETS off(nginx serves the files then)."""
+    def __init__(self, get_response):
+        if not getattr(settings, 'SERVE_ASSETS', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        found = assets.find(request.path_info)
+        if found is None:
+            return self.get_response(request)
+        # not Http404: the error page would need request.user, which nothing has set here
+        return assets.serve(request, *found)
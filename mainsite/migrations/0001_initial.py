@@ -0,0 +1,78 @@
+# Generated by Django 2.2.3 on 2026-10-18 14:01
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Account',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('age', models.IntegerField(blank=True, null=True)),
+                ('views', models.CharField(blank=True, max_length=40)),
+                ('photo', models.ImageField(blank=True, default='profile_logo.png', upload_to='users/%Y/%m/%d/', verbose_name='Аватарка')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Group',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(db_index=True, max_length=150, verbose_name='Название')),
+                ('slug', models.SlugField(max_length=160, null=True, unique=True, verbose_name='URL')),
+                ('description', models.TextField(blank=True, db_index=True, verbose_name='Описание')),
+                ('photo', models.ImageField(blank=True, default='group_logo.jpg', upload_to='groups/%Y/%m/%d/', verbose_name='Фото группы')),
+                ('date_create', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Профсоюз',
+                'ordering': ['-date_create'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=40)),
+                ('slug', models.SlugField(unique=True)),
+            ],
+            options={
+                'ordering': ['title'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Post',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(db_index=True, max_length=150, verbose_name='Заголовок')),
+                ('slug', models.SlugField(max_length=160, unique=True)),
+                ('body', models.TextField(blank=True, db_index=True, verbose_name='Содержание')),
+                ('date_pub', models.DateTimeField(auto_now_add=True)),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='mainsite.Account')),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='mainsite.Group')),
+                ('tags', models.ManyToManyField(blank=True, related_name='posts', to='mainsite.Tag', verbose_name='Тэги')),
+            ],
+            options={
+                'ordering': ['-date_pub'],
+            },
+        ),
+        migrations.AddField(
+            model_name='account',
+            name='groups',
+            field=models.ManyToManyField(blank=True, related_name='owners', to='mainsite.Group'),
+        ),
+        migrations.AddField(
+            model_name='account',
+            name='user',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
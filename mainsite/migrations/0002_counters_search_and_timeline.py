@@ -0,0 +1,182 @@
+# Generated by Django 2.2.3 on 2026-10-18 14:01
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.utils.text import Truncator
+import django.db.models.deletion
+import mainsite.storage
+
+EXCERPT_LENGTH = 700 # Post.excerpt
+FANOUT_LIMIT = 1000 # timeline.FANOUT_LIMIT and BACKFILL at the time of this migration
+BACKFILL = 50
+
+
+def backfill(apps, schema_editor):
+    """
+    Fills what the models keep up to date on save for the rows of a site made before them: the
+    excerpts, the group counters and the timelines. The search index is rebuilt by
+    python manage.py rebuild_search_index.
+    """
+    Account = apps.get_model('mainsite', 'Account')
+    Group = apps.get_model('mainsite', 'Group')
+    Post = apps.get_model('mainsite', 'Post')
+    TimelineEntry = apps.get_model('mainsite', 'TimelineEntry')
+    Membership = Account.groups.through
+
+    for pk, body in Post.objects.values_list('pk', 'body').iterator():
+        Post.objects.filter(pk=pk).update(excerpt=Truncator(body).chars(EXCERPT_LENGTH))
+
+    members = Membership.objects.filter(group_id=OuterRef('pk')).order_by().values('group_id')
+    posts = Post.objects.filter(group_id=OuterRef('pk')).order_by().values('group_id')
+    Group.objects.update(
+        member_count=Subquery(members.annotate(n=Count('*')).values('n')[:1]),
+        post_count=Subquery(posts.annotate(n=Count('*')).values('n')[:1]),
+        last_post_at=Subquery(posts.annotate(last=Max('date_pub')).values('last')[:1]))
+    Group.objects.filter(member_count=None).update(member_count=0) # no rows for the subquery
+    Group.objects.filter(post_count=None).update(post_count=0)
+
+    for group_id in Group.objects.filter(member_count__lte=FANOUT_LIMIT).values_list('pk', flat=True).iterator():
+        latest = list(Post.objects.filter(group_id=group_id).order_by('-date_pub', '-id')
+                      .values_list('pk', 'date_pub')[:BACKFILL])
+        account_ids = Membership.objects.filter(group_id=group_id).values_list('account_id', flat=True)
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(account_id=account_id, post_id=post_id, group_id=group_id, date_pub=date_pub)
+             for account_id in account_ids for post_id, date_pub in latest],
+            batch_size=500, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainsite', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchToken',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64)),
+                ('kind', models.CharField(choices=[('post', 'post'), ('group', 'group')], max_length=5)),
+                ('object_id', models.PositiveIntegerField()),
+                ('weight', models.PositiveIntegerField(default=1)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SlugSequence',
+            fields=[
+                ('name', models.CharField(max_length=20, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_pub', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='account',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='last_post_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='member_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='excerpt',
+            field=models.CharField(blank=True, editable=False, max_length=700),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AlterField(
+            model_name='account',
+            name='photo',
+            field=models.ImageField(blank=True, default='profile_logo.png', storage=mainsite.storage.ContentHashStorage(), upload_to='users/', verbose_name='Аватарка'),
+        ),
+        migrations.AlterField(
+            model_name='group',
+            name='description',
+            field=models.TextField(blank=True, verbose_name='Описание'),
+        ),
+        migrations.AlterField(
+            model_name='group',
+            name='photo',
+            field=models.ImageField(blank=True, default='group_logo.jpg', storage=mainsite.storage.ContentHashStorage(), upload_to='groups/', verbose_name='Фото группы'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='body',
+            field=models.TextField(blank=True, verbose_name='Содержание'),
+        ),
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(fields=['-member_count', '-date_create'], name='group_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(fields=['-last_post_at', '-date_create'], name='group_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', '-date_pub', '-id'], name='post_group_feed_idx'),
+        ),
+        migrations.AddField(
+            model_name='timelineentry',
+            name='account',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='mainsite.Account'),
+        ),
+        migrations.AddField(
+            model_name='timelineentry',
+            name='group',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='mainsite.Group'),
+        ),
+        migrations.AddField(
+            model_name='timelineentry',
+            name='post',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='mainsite.Post'),
+        ),
+        migrations.AddIndex(
+            model_name='searchtoken',
+            index=models.Index(fields=['token', 'kind'], name='search_token_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='searchtoken',
+            index=models.Index(fields=['kind', 'object_id'], name='search_object_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['account', '-date_pub', '-post'], name='timeline_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['account', 'group'], name='timeline_group_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='timelineentry',
+            unique_together={('account', 'post')},
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
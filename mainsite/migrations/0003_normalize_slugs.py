@@ -0,0 +1,31 @@
+from django.db import migrations
+
+
+def normalize(model, fallback):
+    """Lowercases slugs, a slug that is taken in lowercase gets the pk appended."""
+    rows = list(model.objects.order_by('pk').values_list('pk', 'slug'))
+    taken = {slug for pk, slug in rows if slug and slug == slug.lower()} # these stay as they are
+    for pk, slug in rows:
+        if slug and slug in taken:
+            continue
+        new_slug = (slug or fallback(pk)).lower()
+        while new_slug in taken:
+            new_slug = '%s.%d' % (new_slug, pk)
+        taken.add(new_slug)
+        model.objects.filter(pk=pk).update(slug=new_slug)
+
+
+def normalize_slugs(apps, schema_editor):
+    normalize(apps.get_model('mainsite', 'Group'), lambda pk: 'g%d' % pk)
+    normalize(apps.get_model('mainsite', 'Post'), lambda pk: 'post.%d' % pk)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainsite', '0002_counters_search_and_timeline'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_slugs, migrations.RunPython.noop),
+    ]
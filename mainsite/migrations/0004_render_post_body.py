@@ -0,0 +1,31 @@
+# Generated by Django 2.2.3 on 2026-10-18 13:06
+
+from django.db import migrations, models
+from django.utils.html import linebreaks, urlize
+
+
+def render_body(body):
+    # Post.render_body() at the time of this migration, copied: the migration must not follow the model
+    return linebreaks(urlize(body, nofollow=True, autoescape=True))
+
+
+def render_bodies(apps, schema_editor):
+    Post = apps.get_model('mainsite', 'Post')
+    for pk, body in Post.objects.values_list('pk', 'body').iterator():
+        Post.objects.filter(pk=pk).update(body_html=render_body(body))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainsite', '0003_normalize_slugs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='body_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(render_bodies, migrations.RunPython.noop),
+    ]
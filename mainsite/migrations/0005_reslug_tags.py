@@ -0,0 +1,39 @@
+from django.db import migrations
+
+
+def reslug_tags(apps, schema_editor):
+    """
+    Tags are found by the slug of the title(TagQuerySet.resolve), so their slugs follow the new
+    transliteration of utils.slugify. A tag whose new slug is taken is merged into that tag.
+    """
+    from utils import slugify
+    Tag = apps.get_model('mainsite', 'Tag')
+    Through = apps.get_model('mainsite', 'Post').tags.through
+    by_slug = {tag.slug: tag for tag in Tag.objects.order_by('pk')}
+    for tag in list(by_slug.values()):
+        slug = slugify(tag.title)[:50]
+        if not slug or slug == tag.slug:
+            continue
+        keeper = by_slug.get(slug)
+        if keeper is None:
+            del by_slug[tag.slug]
+            tag.slug = slug
+            tag.save(update_fields=['slug'])
+            by_slug[slug] = tag
+            continue
+        posts = Through.objects.filter(tag_id=tag.pk).values_list('post_id', flat=True)
+        Through.objects.bulk_create([Through(post_id=post_id, tag_id=keeper.pk) for post_id in posts],
+                                    ignore_conflicts=True)
+        del by_slug[tag.slug]
+        tag.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainsite', '0004_render_post_body'),
+    ]
+
+    operations = [
+        migrations.RunPython(reslug_tags, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 2.2.3 on 2026-10-18 13:31
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def fill(apps, schema_editor):
+    Post = apps.get_model('mainsite', 'Post')
+    PostTag = apps.get_model('mainsite', 'PostTag')
+    TagCount = apps.get_model('mainsite', 'TagCount')
+    PostTag.objects.update(date_pub=Subquery(Post.objects.filter(pk=OuterRef('post_id')).values('date_pub')[:1]))
+    rows = PostTag.objects.order_by()
+    TagCount.objects.bulk_create(
+        [TagCount(tag_id=tag_id, group_id=None, count=count)
+         for tag_id, count in rows.values('tag_id').annotate(n=Count('*')).values_list('tag_id', 'n')] +
+        [TagCount(tag_id=tag_id, group_id=group_id, count=count)
+         for tag_id, group_id, count in rows.values('tag_id', 'post__group_id').annotate(n=Count('*')).values_list(
+            'tag_id', 'post__group_id', 'n')],
+        batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainsite', '0005_reslug_tags'),
+    ]
+
+    operations = [
+        # the table django made for Post.tags becomes the PostTag model as it is
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.CreateModel(
+                name='PostTag',
+                fields=[
+                    ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                    ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='mainsite.Post')),
+                    ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='mainsite.Tag')),
+                ],
+                options={
+                    'db_table': 'mainsite_post_tags',
+                    'unique_together': {('post', 'tag')},
+                },
+            ),
+            migrations.AlterField(
+                model_name='post',
+                name='tags',
+                field=models.ManyToManyField(blank=True, related_name='posts', through='mainsite.PostTag', to='mainsite.Tag', verbose_name='Тэги'),
+            ),
+        ]),
+        migrations.AddField(
+            model_name='posttag',
+            name='date_pub',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='posttag',
+            index=models.Index(fields=['tag', '-date_pub', '-post'], name='tag_posts_idx'),
+        ),
+        migrations.CreateModel(
+            name='TagCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.IntegerField(default=0)),
+                ('group', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='mainsite.Group')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='mainsite.Tag')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='tagcount',
+            index=models.Index(fields=['group', '-count'], name='tag_cloud_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='tagcount',
+            constraint=models.UniqueConstraint(fields=('group', 'tag'), name='tag_count_group_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='tagcount',
+            constraint=models.UniqueConstraint(condition=models.Q(group=None), fields=('tag',), name='tag_count_site_uniq'),
+        ),
+        migrations.RunPython(fill, migrations.RunPython.noop),
+    ]
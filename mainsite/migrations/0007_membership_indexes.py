@@ -0,0 +1,23 @@
+# Generated by Django 2.2.3 on 2026-10-18 14:02
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # keyset pages of members.py: the members of a group and the groups of an account by the row id.
+    # Account.groups has no model of its own to declare them in Meta.indexes.
+
+    dependencies = [
+        ('mainsite', '0006_post_tags_and_counts'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX membership_group_idx ON mainsite_account_groups (group_id, id)',
+            'DROP INDEX membership_group_idx',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX membership_account_idx ON mainsite_account_groups (account_id, id)',
+            'DROP INDEX membership_account_idx',
+        ),
+    ]
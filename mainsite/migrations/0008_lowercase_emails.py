@@ -0,0 +1,35 @@
+# Generated by Django 2.2.3 on 2026-10-18 15:10
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models.functions import Lower
+
+
+def lowercase_emails(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    User.objects.exclude(email=Lower('email')).update(email=Lower('email'))
+
+
+def add_index(apps, schema_editor): # the user model is swappable, its table is not always auth_user
+    table = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))._meta.db_table
+    schema_editor.execute('CREATE INDEX user_email_idx ON %s (email)' % schema_editor.quote_name(table))
+
+
+def drop_index(apps, schema_editor):
+    schema_editor.execute('DROP INDEX user_email_idx')
+
+
+class Migration(migrations.Migration):
+    # emails are stored in lowercase(signals.lowercase_email), so the uniqueness checks of the forms
+    # are exact lookups by this index instead of UPPER(email) LIKE UPPER(...) over the whole table.
+    # Not unique: old databases can have the same address twice.
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('mainsite', '0007_membership_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(lowercase_emails, migrations.RunPython.noop),
+        migrations.RunPython(add_index, drop_index),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.3 on 2026-10-18 14:04
+
+from django.db import migrations, models
+from django.db.models import F
+import django.utils.timezone
+
+
+def fill_empty(apps, schema_editor):
+    Group = apps.get_model('mainsite', 'Group')
+    Group.objects.filter(last_post_at=None).update(last_post_at=F('date_create'))
+
+
+class Migration(migrations.Migration):
+    # groups without posts sort by their creation time in the 'active' mode; a NULL went first on postgres
+
+    dependencies = [
+        ('mainsite', '0008_lowercase_emails'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_empty, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='group',
+            name='last_post_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
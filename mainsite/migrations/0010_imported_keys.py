@@ -0,0 +1,26 @@
+# Generated by Django 2.2.3 on 2026-10-18 14:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainsite', '0009_group_last_post_not_null'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportedKey',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=100)),
+                ('kind', models.CharField(max_length=10)),
+                ('key', models.CharField(max_length=160)),
+                ('object_id', models.PositiveIntegerField()),
+            ],
+            options={
+                'unique_together': {('source', 'kind', 'key')},
+            },
+        ),
+    ]
@@ -1,9 +1,65 @@
+from django.core.cache import cache
+from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from mainsite.membership import is_member
 from mainsite.models import Group
+from mainsite.page_cache import PAGE_TIMEOUT, page_key, page_version
+from mainsite.slugs import canonical
 
 class OwnerCheck:
     def dispatch(self, request, *args, **kwargs):
-        self.group = get_object_or_404(Group, slug__iexact=kwargs.get('slug'))
-        if self.group not in request.user.account.groups.all():
+        self.group = get_object_or_404(Group, slug=canonical(kwargs.get('slug')))
+        if not is_member(request, self.group):
             return redirect(self.group)
-        return super().dispatch(request, *args, **kwargs)
\ No newline at end of file
+        return super().dispatch(request, *args, **kwargs)
+
+class FirstLastPagination: # for ListView: ?page= also understands 'first' and 'last'
+    def paginate_queryset(self, queryset, page_size):
+        paginator = self.get_paginator(queryset, page_size, allow_empty_first_page=self.get_allow_empty())
+        page = self.request.GET.get('page') or 1
+        try:
+            page_number = int(page)
+        except ValueError:
+            if page == 'last':
+                page_number = paginator.num_pages
+            elif page == 'first':
+                page_number = 1
+            else:
+                raise Http404(u"Page is not 'last' or 'first', nor can it be converted to an int.")
+        page = paginator.get_page(page_number) # get_page исключает ошибки, вместо просто page()
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+
+class AnonymousPageCache:
+    """
+    For anonymous GET requests: answers 304 when the client has the current version, otherwise
+    serves the rendered page from the cache. The view defines get_last_modified() - a cheap
+    query for the time of the last change of what the page shows(None if there is no object).
+    """
+    def get_last_modified(self):
+        raise NotImplementedError
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+            return super().dispatch(request, *args, **kwargs)
+        last_modified = self.get_last_modified()
+        if last_modified is None:
+            return super().dispatch(request, *args, **kwargs)
+        version = page_version(last_modified)
+        etag = quote_etag(version)
+        response = get_conditional_response(request, etag=etag, last_modified=int(last_modified.timestamp()))
+        if response is None:
+            key = page_key(request.get_full_path(), version)
+            response = cache.get(key)
+            if response is None:
+                response = super().dispatch(request, *args, **kwargs)
+                if hasattr(response, 'render'):
+                    response.render()
+                if response.status_code == 200:
+                    cache.set(key, response, PAGE_TIMEOUT)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        return response
@@ -1,37 +1,54 @@
-from time import time
-
 from django.contrib.auth import get_user_model
 from django.db import models
 from django.shortcuts import reverse
-from utils import slugify
-
-
-def gen_post_slug(slug):
-    new_slug = slugify(slug)
-    return new_slug + '.' + str(int(time()))
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.html import linebreaks, urlize
+from django.utils.text import Truncator
+from utils import slugify, slugify_many
+from .storage import ContentHashStorage
 
 class Account(models.Model):
     user = models.OneToOneField(get_user_model(), on_delete=models.CASCADE)
     age = models.IntegerField(blank=True, null=True)
     groups = models.ManyToManyField('Group', related_name='owners', blank=True)
     views = models.CharField(max_length=40, blank=True)
-    photo = models.ImageField(verbose_name=u'Аватарка', default='profile_logo.png', upload_to='users/%Y/%m/%d/', blank=True)
+    photo = models.ImageField(verbose_name=u'Аватарка', default='profile_logo.png', upload_to='users/',
+                              storage=ContentHashStorage(), blank=True)
+    updated_at = models.DateTimeField(auto_now=True) # version of the cached fragments, see fragments.py
 
     def get_absolute_url(self):
         return reverse('profile', kwargs={'pk': self.pk})
 
+    @cached_property
+    def group_preview(self): # the newest groups for the profile card, the rest is loaded on scroll(members.py)
+        from .members import PREVIEW, groups_page
+        return groups_page(self, size=PREVIEW)
+
     def __str__(self):
         return self.user.username
 
 class Group(models.Model):
     name = models.CharField(max_length=150, db_index=True, verbose_name=u'Название')
     slug = models.SlugField(max_length=160, unique=True, null=True, verbose_name=u'URL')
-    description = models.TextField(verbose_name='Описание', blank=True, db_index=True)
-    photo = models.ImageField(verbose_name=u'Фото группы', default='group_logo.jpg', upload_to='groups/%Y/%m/%d/', blank=True)
+    description = models.TextField(verbose_name='Описание', blank=True)
+    photo = models.ImageField(verbose_name=u'Фото группы', default='group_logo.jpg', upload_to='groups/',
+                              storage=ContentHashStorage(), blank=True)
     date_create = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True) # also Last-Modified of the group list
+    # denormalized, kept by signals.py, recounted by the repair_group_counters command
+    member_count = models.PositiveIntegerField(default=0, editable=False)
+    post_count = models.PositiveIntegerField(default=0, editable=False)
+    # the creation time until the first post: never NULL, which DESC puts first on postgres
+    last_post_at = models.DateTimeField(default=timezone.now, editable=False)
+    COUNTERS = ('member_count', 'post_count', 'last_post_at')
     class Meta:
         verbose_name = "Профсоюз"
         ordering = ["-date_create"]
+        indexes = [ # GroupList sort modes
+            models.Index(fields=['-member_count', '-date_create'], name='group_popular_idx'),
+            models.Index(fields=['-last_post_at', '-date_create'], name='group_active_idx'),
+        ]
     
     def get_absolute_url(self):
         return reverse('group_info', kwargs={'slug': self.slug})
@@ -39,47 +56,177 @@ class Group(models.Model):
         return reverse('group_update', kwargs={'slug': self.slug})
     def get_delete_url(self):
         return reverse('group_delete', kwargs={'slug': self.slug})
+    @cached_property
+    def member_preview(self): # the newest members for the header, the rest is loaded on scroll(members.py)
+        from .members import PREVIEW, members_page
+        return members_page(self, size=PREVIEW)
     def save(self, *args, **kwarg):
+        if self.pk and not kwarg.get('force_insert') and kwarg.get('update_fields') is None:
+            # never write back the counters read with the object, signals change them concurrently
+            kwarg['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                      if not field.primary_key and field.name not in self.COUNTERS]
+        from .slugs import canonical, group_slug
+        self.slug = canonical(self.slug) or group_slug()
         super().save(*args, **kwarg)
-        if not self.slug: # self.id
-            self.slug = 'g' + str(self.pk)
-            super().save(*args, **kwarg)
     def __str__(self):
         return self.name
 
+class TagQuerySet(models.QuerySet):
+    def resolve(self, titles):
+        """
+        Tags for the titles: existing ones are found with one query by slug, missing ones are
+        inserted with one bulk insert. Titles with the same slug("Тег", "тег ") give one tag.
+        """
+        wanted = {}
+        titles = [title.strip()[:40] for title in titles]
+        for title, slug in zip(titles, slugify_many(titles)):
+            slug = slug[:50]
+            if slug and slug not in wanted: # special chars only -> empty slug, skip it
+                wanted[slug] = title
+        if not wanted:
+            return []
+        tags = {tag.slug: tag for tag in self.filter(slug__in=wanted)}
+        missing = [Tag(title=title, slug=slug) for slug, title in wanted.items() if slug not in tags]
+        if missing:
+            # a concurrent post may insert the same tag right now: skip the conflict and re-read
+            self.bulk_create(missing, ignore_conflicts=True)
+            tags = {tag.slug: tag for tag in self.filter(slug__in=wanted)}
+        return [tags[slug] for slug in wanted if slug in tags]
+
 class Tag(models.Model):
     title = models.CharField(max_length=40)
     slug = models.SlugField(max_length=50, unique=True)
+
+    objects = TagQuerySet.as_manager()
+
     class Meta:
         ordering = ["title"]
 
     def save(self, *args, **kwarg):
-        print(self.title)
-        print(slugify(self.title))
-        self.slug = slugify(self.title)
+        if not self.slug:
+            self.slug = slugify(self.title)[:50]
         super().save(*args, **kwarg)
 
+    def get_absolute_url(self):
+        return reverse('tag_detail', kwargs={'tagslug': self.slug})
+
     def __str__(self):
         return self.title
 
+class PostQuerySet(models.QuerySet):
+    def feed(self):
+        # everything the post card needs: author -> user, group and tags
+        return self.select_related('author__user', 'group').prefetch_related('tags')
+    def cards(self):
+        # feed() restricted to the columns of a post card: no full body, only the stored excerpt
+        return self.feed().only(
+            'title', 'slug', 'excerpt', 'date_pub', 'updated_at',
+            'group__name', 'group__slug', 'group__updated_at',
+            'author__updated_at', 'author__user__username', 'author__user__first_name',
+        )
+
 class Post(models.Model):
     title = models.CharField(max_length=150, db_index=True, verbose_name=u'Заголовок')
     author = models.ForeignKey('Account', on_delete=models.CASCADE)
     group = models.ForeignKey('Group', on_delete=models.CASCADE)
     slug = models.SlugField(max_length=160, unique=True)
-    body = models.TextField(blank=True, db_index=True, verbose_name=u'Содержание')
-    tags = models.ManyToManyField('Tag', related_name='posts', blank=True, verbose_name=u'Тэги')
+    body = models.TextField(blank=True, verbose_name=u'Содержание')
+    excerpt = models.CharField(max_length=700, blank=True, editable=False) # body truncated for the feed cards
+    body_html = models.TextField(blank=True, editable=False) # body rendered once on save, see render_body()
+    tags = models.ManyToManyField('Tag', related_name='posts', blank=True, through='PostTag', verbose_name=u'Тэги')
     date_pub = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = PostQuerySet.as_manager()
+
+    def add_tags(self, tags):
+        # one insert into the m2m table instead of tags.add() per tag; receivers still get m2m_changed
+        # with only the new tags, like from add(), the tag counts depend on it
+        existing = set(PostTag.objects.filter(post=self, tag__in=tags).values_list('tag_id', flat=True))
+        new = {tag.pk for tag in tags} - existing
+        PostTag.objects.bulk_create(
+            [PostTag(post_id=self.pk, tag_id=pk, date_pub=self.date_pub) for pk in new], ignore_conflicts=True)
+        if new:
+            models.signals.m2m_changed.send(
+                sender=PostTag, instance=self, action='post_add', reverse=False,
+                model=Tag, pk_set=new, using=self._state.db)
 
     def get_absolute_url(self):
-        return reverse('post_detail', kwargs={'slug': self.group.slug, 'postslug': self.slug})
+        return reverse('post_detail', kwargs={'postslug': self.slug})
+
+    @staticmethod
+    def render_body(body):
+        # escaped text with links and <p>/<br> - what |urlize|linebreaks would give on every view
+        return linebreaks(urlize(body, nofollow=True, autoescape=True))
 
     def save(self, *args, **kwarg):
         if not self.pk: # self.id
-            self.slug = gen_post_slug(self.title)
+            from .slugs import post_slug
+            self.slug = post_slug(self.title)
+        self.excerpt = Truncator(self.body).chars(700)
+        self.body_html = self.render_body(self.body)
         super().save(*args, **kwarg)
 
     def __str__(self):
         return self.title
     class Meta:
         ordering = ["-date_pub"]
+        indexes = [
+            models.Index(fields=['group', '-date_pub', '-id'], name='post_group_feed_idx'), # keyset pagination
+        ]
+
+class SearchToken(models.Model): # inverted index for databases without FTS5, see mainsite/search.py
+    KINDS = (('post', 'post'), ('group', 'group'))
+    token = models.CharField(max_length=64)
+    kind = models.CharField(max_length=5, choices=KINDS)
+    object_id = models.PositiveIntegerField()
+    weight = models.PositiveIntegerField(default=1)
+    class Meta:
+        indexes = [
+            models.Index(fields=['token', 'kind'], name='search_token_idx'),
+            models.Index(fields=['kind', 'object_id'], name='search_object_idx'),
+        ]
+
+class SlugSequence(models.Model): # counters for the slug suffixes, see mainsite/slugs.py
+    name = models.CharField(max_length=20, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+class PostTag(models.Model): # the table of Post.tags, with the date to list the posts of a tag by the index
+    post = models.ForeignKey('Post', on_delete=models.CASCADE)
+    tag = models.ForeignKey('Tag', on_delete=models.CASCADE)
+    date_pub = models.DateTimeField(default=timezone.now) # copy of post.date_pub, set by signals.py on add()
+    class Meta:
+        db_table = 'mainsite_post_tags' # the table django made for Post.tags before
+        unique_together = ('post', 'tag')
+        indexes = [models.Index(fields=['tag', '-date_pub', '-post'], name='tag_posts_idx')]
+
+class TagCount(models.Model): # posts per tag in a group and on the whole site(group=None), see mainsite/tags.py
+    tag = models.ForeignKey('Tag', on_delete=models.CASCADE)
+    group = models.ForeignKey('Group', on_delete=models.CASCADE, null=True)
+    count = models.IntegerField(default=0)
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['group', 'tag'], name='tag_count_group_uniq'),
+            models.UniqueConstraint(fields=['tag'], condition=models.Q(group=None), name='tag_count_site_uniq'),
+        ]
+        indexes = [models.Index(fields=['group', '-count'], name='tag_cloud_idx')]
+
+class TimelineEntry(models.Model): # materialized home feed of an account, see mainsite/timeline.py
+    account = models.ForeignKey('Account', on_delete=models.CASCADE)
+    post = models.ForeignKey('Post', on_delete=models.CASCADE)
+    group = models.ForeignKey('Group', on_delete=models.CASCADE) # to drop the entries on leaving
+    date_pub = models.DateTimeField() # copy of post.date_pub, the feed is ordered by the index below
+    class Meta:
+        unique_together = ('account', 'post')
+        indexes = [
+            models.Index(fields=['account', '-date_pub', '-post'], name='timeline_feed_idx'),
+            models.Index(fields=['account', 'group'], name='timeline_group_idx'),
+        ]
+
+class ImportedKey(models.Model): # local pk of an object imported from a source, see mainsite/transfer.py
+    source = models.CharField(max_length=100)
+    kind = models.CharField(max_length=10) # 'account', 'group' or 'post'
+    key = models.CharField(max_length=160) # username or slug in the source
+    object_id = models.PositiveIntegerField()
+    class Meta:
+        unique_together = ('source', 'kind', 'key')
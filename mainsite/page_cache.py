@@ -0,0 +1,37 @@
+"""
+Whole-page cache for anonymous visitors of the public pages(see mixins.AnonymousPageCache).
+
+A page version is the last modification time of what it shows(one indexed query), the group
+count from the navbar and a generation number that receivers bump on deletions, which do not
+leave a newer timestamp behind. Any change gives a new ETag and a new cache key, so old entries
+are never served again and simply expire.
+"""
+from django.core.cache import cache
+
+from .counters import get_group_count
+
+PAGE_TIMEOUT = 60 * 10
+GENERATION_KEY = 'pages:generation'
+
+
+def get_generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        generation = 0
+        cache.add(GENERATION_KEY, generation, None)
+    return generation
+
+
+def purge_pages():
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, None)
+
+
+def page_version(last_modified):
+    return '%d-%d-%d' % (last_modified.timestamp() * 1000000, get_generation(), get_group_count())
+
+
+def page_key(path, version):
+    return 'pages:%s:%s' % (version, path)
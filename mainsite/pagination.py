@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta, timezone
+
+from django.db.models import Q
+from django.http import Http404
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+class KeysetPage:
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    def next_cursor(self):
+        return self.paginator.cursor_for(self.object_list[-1]) if self._has_next else None
+
+    def previous_cursor(self):
+        return self.paginator.cursor_for(self.object_list[0]) if self._has_previous else None
+
+
+class KeysetPaginator:
+    """
+    Pagination by (field, id) instead of OFFSET: every page is one indexed range scan, so page 1000
+    costs the same as page 1. Understands the same 'first'/'last' values of ?page= as GroupList,
+    and ?after=<cursor>/?before=<cursor> for the next/previous pages. tiebreak is the column the
+    pk of the cursor is compared with, for querysets of rows that point to the listed objects.
+    """
+    def __init__(self, queryset, per_page, field='date_pub', tiebreak='pk'):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.field = field
+        self.tiebreak = tiebreak
+
+    def cursor_for(self, obj):
+        value = getattr(obj, self.field)
+        return '%d-%d' % ((value - EPOCH) // MICROSECOND, obj.pk)
+
+    def parse_cursor(self, cursor):
+        try:
+            stamp, pk = cursor.split('-')
+            value = EPOCH + int(stamp) * MICROSECOND
+            return value, int(pk)
+        except (ValueError, OverflowError, OSError):
+            raise Http404(u"Invalid cursor.")
+
+    def _slice(self, queryset, descending):
+        order = ('-' + self.field, '-' + self.tiebreak) if descending else (self.field, self.tiebreak)
+        return list(queryset.order_by(*order)[:self.per_page + 1])
+
+    def get_page(self, page=None, after=None, before=None):
+        if after:
+            value, pk = self.parse_cursor(after)
+            older = Q(**{self.field + '__lt': value}) | Q(**{self.field: value, self.tiebreak + '__lt': pk})
+            objects = self._slice(self.queryset.filter(older), descending=True)
+            return KeysetPage(objects[:self.per_page], self, len(objects) > self.per_page, True)
+        if before:
+            value, pk = self.parse_cursor(before)
+            newer = Q(**{self.field + '__gt': value}) | Q(**{self.field: value, self.tiebreak + '__gt': pk})
+            objects = self._slice(self.queryset.filter(newer), descending=False)
+            return KeysetPage(objects[:self.per_page][::-1], self, True, len(objects) > self.per_page)
+        if page == 'last':
+            objects = self._slice(self.queryset, descending=False)
+            return KeysetPage(objects[:self.per_page][::-1], self, False, len(objects) > self.per_page)
+        if page in (None, '', 'first', '1'):
+            objects = self._slice(self.queryset, descending=True)
+            return KeysetPage(objects[:self.per_page], self, len(objects) > self.per_page, False)
+        raise Http404(u"Page is not 'last' or 'first'.")
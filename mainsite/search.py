@@ -0,0 +1,153 @@
+"""
+Full-text search over posts and groups.
+
+Text is tokenized with utils.slugify, so Cyrillic is transliterated the same way as in slugs and
+"тигр", "Тигр" and "tigr" all end up as the token "tigr". The index lives in an SQLite FTS5
+table when the database supports it, otherwise in the SearchToken table. Either way it is
+updated from the post_save/post_delete signals of Post and Group (see signals.py).
+"""
+from collections import Counter
+
+from django.db import DatabaseError, connection
+from django.db.models import Count, Sum
+
+from utils import slugify
+from .models import Group, Post, SearchToken
+
+FTS_TABLE = 'mainsite_search_fts'
+MAX_RESULTS = 500
+TITLE_WEIGHT = 10
+KINDS = ('post', 'group')
+
+_fts5_connections = set() # aliases of the connections where the FTS5 table exists
+
+
+def tokenize(text):
+    return [token[:64] for token in slugify(text or '').split('-') if token]
+
+
+def document(kind, obj):
+    if kind == 'post':
+        return obj.title, obj.body
+    return obj.name, obj.description
+
+
+def setup_fts5(sender, connection, **kwargs): # connection_created receiver
+    if connection.vendor != 'sqlite':
+        return
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE VIRTUAL TABLE IF NOT EXISTS %s USING fts5(title, body)' % FTS_TABLE)
+    except DatabaseError: # sqlite built without FTS5
+        _fts5_connections.discard(connection.alias)
+    else:
+        _fts5_connections.add(connection.alias)
+
+
+class FTS5Backend:
+    # rowid packs the kind into the lowest bit, so updates and deletes are rowid lookups
+    def rowid(self, kind, object_id):
+        return object_id * 2 + KINDS.index(kind)
+
+    def remove(self, kind, object_id):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM %s WHERE rowid = %%s' % FTS_TABLE, [self.rowid(kind, object_id)])
+
+    def index(self, kind, object_id, title, body):
+        self.remove(kind, object_id)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO %s (rowid, title, body) VALUES (%%s, %%s, %%s)' % FTS_TABLE,
+                [self.rowid(kind, object_id), ' '.join(tokenize(title)), ' '.join(tokenize(body))],
+            )
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM %s' % FTS_TABLE)
+
+    def search(self, tokens, kind=None):
+        match = ' '.join('"%s"' % token for token in tokens)
+        sql = 'SELECT rowid FROM %s WHERE %s MATCH %%s' % (FTS_TABLE, FTS_TABLE)
+        params = [match]
+        if kind:
+            sql += ' AND rowid %% 2 = %s'
+            params.append(KINDS.index(kind))
+        sql += ' ORDER BY bm25(%s, %s, 1.0) LIMIT %d' % (FTS_TABLE, float(TITLE_WEIGHT), MAX_RESULTS)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [(KINDS[rowid % 2], rowid // 2) for rowid, in cursor.fetchall()]
+
+
+class TokenTableBackend:
+    def remove(self, kind, object_id):
+        SearchToken.objects.filter(kind=kind, object_id=object_id).delete()
+
+    def index(self, kind, object_id, title, body):
+        self.remove(kind, object_id)
+        weights = Counter()
+        for token in tokenize(title):
+            weights[token] += TITLE_WEIGHT
+        for token in tokenize(body):
+            weights[token] += 1
+        SearchToken.objects.bulk_create(
+            SearchToken(token=token, kind=kind, object_id=object_id, weight=weight)
+            for token, weight in weights.items()
+        )
+
+    def clear(self):
+        SearchToken.objects.all().delete()
+
+    def search(self, tokens, kind=None):
+        rows = SearchToken.objects.filter(token__in=tokens)
+        if kind:
+            rows = rows.filter(kind=kind)
+        rows = (rows.values('kind', 'object_id')
+                .annotate(matched=Count('id'), score=Sum('weight'))
+                .filter(matched=len(set(tokens))) # every word of the query
+                .order_by('-score', '-object_id'))
+        return [(row['kind'], row['object_id']) for row in rows[:MAX_RESULTS]]
+
+
+def get_backend():
+    connection.ensure_connection()
+    if connection.alias in _fts5_connections:
+        return FTS5Backend()
+    return TokenTableBackend()
+
+
+def index_object(kind, obj):
+    get_backend().index(kind, obj.pk, *document(kind, obj))
+
+
+def remove_object(kind, obj):
+    get_backend().remove(kind, obj.pk)
+
+
+def rebuild_index(chunk_size=2000):
+    backend = get_backend()
+    backend.clear()
+    count = 0
+    for kind, queryset in (('group', Group.objects.only('name', 'description')),
+                           ('post', Post.objects.only('title', 'body'))):
+        for obj in queryset.order_by().iterator(chunk_size=chunk_size):
+            backend.index(kind, obj.pk, *document(kind, obj))
+            count += 1
+    return count
+
+
+def search(query, kind=None):
+    """Ranked list of (kind, pk) pairs, best match first."""
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+    return get_backend().search(tokens, kind)
+
+
+def load_results(pairs):
+    """(kind, pk) pairs -> (kind, object) pairs in the same order, one query per kind."""
+    ids = {kind: [pk for k, pk in pairs if k == kind] for kind in KINDS}
+    objects = {
+        'post': Post.objects.cards().in_bulk(ids['post']) if ids['post'] else {},
+        'group': Group.objects.in_bulk(ids['group']) if ids['group'] else {},
+    }
+    return [(kind, objects[kind][pk]) for kind, pk in pairs if pk in objects[kind]]
@@ -0,0 +1,199 @@
+from django.contrib.auth import get_user_model
+from django.db.backends.signals import connection_created
+from django.db.models import OuterRef, Subquery
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import database, images, search, tags, timeline
+from .middleware import forget_users
+from .counters import change_group_count, change_member_count, post_added, post_removed
+from .page_cache import purge_pages
+from .models import Account, Group, Post, PostTag
+
+connection_created.connect(database.configure_sqlite)
+connection_created.connect(search.setup_fts5)
+
+
+@receiver(post_save, sender=Group)
+def group_created(sender, instance, created, **kwargs):
+    if created:
+        change_group_count(1)
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    change_group_count(-1)
+    purge_pages()
+
+# ------------- search index ----------------
+
+SEARCH_FIELDS = {Post: {'title', 'body'}, Group: {'name', 'description'}}
+SEARCH_KINDS = {Post: 'post', Group: 'group'}
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Group)
+def index_for_search(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or SEARCH_FIELDS[sender] & set(update_fields):
+        search.index_object(SEARCH_KINDS[sender], instance)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Group)
+def remove_from_search(sender, instance, **kwargs):
+    search.remove_object(SEARCH_KINDS[sender], instance)
+
+# ------------- fragment versions ----------------
+# cached fragments are keyed by updated_at(see fragments.py), so everything that changes what a
+# fragment shows without saving the object itself has to bump it. update() sends no signals.
+
+def touch(queryset):
+    queryset.update(updated_at=timezone.now())
+
+
+def touch_accounts(queryset): # the cached request.user carries the account, see middleware.py
+    forget_users(queryset.values_list('user_id', flat=True))
+    touch(queryset)
+
+
+@receiver(m2m_changed, sender=Account.groups.through)
+def membership_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('pre_remove', 'pre_clear'):
+        # remember the rows that are really there: remove() reports every given id, clear() none
+        rows = sender.objects.filter(group=instance) if reverse else sender.objects.filter(account=instance)
+        other = 'account_id' if reverse else 'group_id'
+        if action == 'pre_remove':
+            rows = rows.filter(**{other + '__in': pk_set})
+        instance._removed_pks = set(rows.values_list(other, flat=True))
+        return
+    if action in ('post_remove', 'post_clear'):
+        pk_set, delta = instance.__dict__.pop('_removed_pks', set()), -1
+    elif action == 'post_add': # only the new rows are reported
+        delta = 1
+    else:
+        return
+    if not pk_set:
+        return
+    accounts, groups = (pk_set, [instance.pk]) if reverse else ([instance.pk], pk_set)
+    change_member_count(groups, delta * len(accounts))
+    touch_accounts(Account.objects.filter(pk__in=accounts))
+    if delta > 0:
+        timeline.backfill(accounts, groups)
+    else:
+        timeline.drop(accounts, groups)
+
+
+@receiver(pre_delete, sender=Account)
+def account_deleting(sender, instance, **kwargs): # the cascade deletes the membership rows without m2m_changed
+    instance._group_ids = list(sender.groups.through.objects.filter(account=instance).values_list('group_id', flat=True))
+
+
+@receiver(post_delete, sender=Account)
+def account_deleted(sender, instance, **kwargs):
+    change_member_count(instance.__dict__.pop('_group_ids', []), -1) # touches the groups too
+
+
+@receiver(m2m_changed, sender=PostTag)
+def post_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('pre_remove', 'pre_clear'):
+        # remember the rows that are really there, like membership_changed does
+        rows = sender.objects.filter(tag=instance) if reverse else sender.objects.filter(post=instance)
+        if action == 'pre_remove':
+            rows = rows.filter(**{('post_id' if reverse else 'tag_id') + '__in': pk_set})
+        instance._removed_tag_rows = list(rows.values_list('tag_id', 'post__group_id', 'post_id'))
+        return
+    if action in ('post_remove', 'post_clear'):
+        rows, delta = instance.__dict__.pop('_removed_tag_rows', []), -1
+    elif action == 'post_add': # only the new rows are reported
+        added = sender.objects.filter(tag=instance, post_id__in=pk_set) if reverse else \
+            sender.objects.filter(post=instance, tag_id__in=pk_set)
+        # tags.add() leaves the default date in the rows, add_tags() and the bulk inserts copy it
+        added.update(date_pub=Subquery(Post.objects.filter(pk=OuterRef('post_id')).values('date_pub')[:1]))
+        rows, delta = list(added.values_list('tag_id', 'post__group_id', 'post_id')), 1
+    else:
+        return
+    if not rows:
+        return
+    tags.change_tag_counts([(tag_id, group_id) for tag_id, group_id, post_id in rows], delta)
+    posts = Post.objects.filter(pk__in={post_id for tag_id, group_id, post_id in rows})
+    touch(Group.objects.filter(pk__in={group_id for tag_id, group_id, post_id in rows})) # the tag cloud and the cards
+    touch(posts)
+
+
+@receiver(pre_save, sender=get_user_model())
+def lowercase_email(sender, instance, **kwargs): # the forms look emails up by an exact match, see migration 0008
+    if instance.email:
+        instance.email = instance.email.lower()
+
+
+CARD_FIELDS = ('username', 'email', 'first_name', 'last_name') # what the cards show of a user
+
+
+@receiver(pre_save, sender=get_user_model())
+def user_saving(sender, instance, update_fields=None, **kwargs):
+    # login() saves only last_login: no query, nothing to touch(the profile card is keyed on it itself)
+    if instance.pk is None or update_fields is not None and not set(update_fields) & set(CARD_FIELDS):
+        return
+    instance._card_fields = sender.objects.filter(pk=instance.pk).values_list(*CARD_FIELDS).first()
+
+
+@receiver(post_save, sender=get_user_model())
+def user_changed(sender, instance, created, **kwargs):
+    forget_users([instance.pk])
+    before = instance.__dict__.pop('_card_fields', None)
+    if created or before is None:
+        return
+    changed = {field for field, value in zip(CARD_FIELDS, before) if getattr(instance, field) != value}
+    if changed:
+        touch(Account.objects.filter(user=instance)) # post cards and the profile card
+    if 'first_name' in changed:
+        touch(Group.objects.filter(owners__user=instance)) # the members strip
+    if changed & {'username', 'first_name'}: # the post cards, of groups the user may have left too
+        touch(Group.objects.filter(post__author__user=instance))
+
+
+@receiver(post_save, sender=Account)
+def account_changed(sender, instance, created, **kwargs): # avatar in the members strip
+    forget_users([instance.user_id])
+    if not created:
+        touch(Group.objects.filter(owners=instance))
+
+
+@receiver(post_delete, sender=get_user_model())
+@receiver(post_delete, sender=Account)
+def user_deleted(sender, instance, **kwargs):
+    forget_users([instance.user_id if sender is Account else instance.pk])
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs): # the group page lists the posts
+    if created:
+        post_added(instance) # touches the group too
+        timeline.fan_out(instance)
+    else:
+        touch(Group.objects.filter(pk=instance.group_id))
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs): # the cascade deletes the PostTag rows without m2m_changed
+    instance._tag_ids = list(PostTag.objects.filter(post=instance).values_list('tag_id', flat=True))
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    post_removed(instance)
+    tags.change_tag_counts([(tag_id, instance.group_id) for tag_id in instance.__dict__.pop('_tag_ids', [])], -1)
+    purge_pages()
+
+
+# ------------- image variants ----------------
+
+@receiver(post_save, sender=Account)
+@receiver(post_save, sender=Group)
+def photo_saved(sender, instance, update_fields=None, **kwargs):
+    # the default pictures are shared by everyone, build_image_variants takes care of them
+    if instance.photo.name in (None, '', sender._meta.get_field('photo').default):
+        return
+    if update_fields is None or 'photo' in update_fields:
+        images.schedule_variants(instance.photo.name)
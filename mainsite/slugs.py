@@ -0,0 +1,86 @@
+"""
+Unique canonical(lowercase) slugs issued before the insert, so every object is written once.
+
+Posts get <slugified title>-<base36 number>, groups without a user-chosen slug get g-<base36 number>.
+The numbers come from SlugSequence rows incremented atomically, so two posts with the same title
+never collide, whenever they are created. Old slugs('title.1558861234', 'g12') can not clash
+with the new ones: they have no '-<base36>' ending or no hyphen at all.
+"""
+import re
+import string
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from utils import slugify
+from .models import SlugSequence
+
+DIGITS = string.digits + string.ascii_lowercase
+GROUP_SLUG_RE = re.compile(r'^g-[0-9a-z]+$') # reserved for generated group slugs
+NUMBER_RE = re.compile(r'^[0-9a-z]{1,12}$')
+
+
+def base36(number):
+    encoded = ''
+    while True:
+        number, digit = divmod(number, 36)
+        encoded = DIGITS[digit] + encoded
+        if not number:
+            return encoded
+
+
+def next_value(name, count=1):
+    """Takes count numbers of the sequence, returns the last one."""
+    with transaction.atomic():
+        if not SlugSequence.objects.filter(name=name).update(value=F('value') + count):
+            try:
+                with transaction.atomic():
+                    SlugSequence.objects.create(name=name, value=count)
+                return count
+            except IntegrityError: # created concurrently
+                SlugSequence.objects.filter(name=name).update(value=F('value') + count)
+        # the row stays locked by our update until the commit, so this is our value
+        return SlugSequence.objects.values_list('value', flat=True).get(name=name)
+
+
+def advance_to(name, value):
+    """The next numbers of the sequence will be above value, for slugs that come from elsewhere."""
+    SlugSequence.objects.get_or_create(name=name)
+    SlugSequence.objects.filter(name=name, value__lt=value).update(value=value)
+
+
+def slug_number(slug):
+    """The base36 number at the end of a generated slug, 0 if there is none."""
+    number = slug.rpartition('-')[2]
+    return int(number, 36) if NUMBER_RE.match(number) else 0
+
+
+def title_base(title):
+    return slugify(title)[:140].strip('-') or 'post' # titles of special chars only give ''
+
+
+def post_slug(title):
+    return '%s-%s' % (title_base(title), base36(next_value('post')))
+
+
+def post_slugs(titles):
+    """post_slug() of every title with one update of the sequence, for bulk_create."""
+    if not titles:
+        return []
+    first = next_value('post', len(titles)) - len(titles) + 1
+    return ['%s-%s' % (title_base(title), base36(first + i)) for i, title in enumerate(titles)]
+
+
+def group_slug():
+    return 'g-' + base36(next_value('group'))
+
+
+def group_slugs(count):
+    if not count:
+        return []
+    first = next_value('group', count) - count + 1
+    return ['g-' + base36(first + i) for i in range(count)]
+
+
+def canonical(slug):
+    return (slug or '').lower()
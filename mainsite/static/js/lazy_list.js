@@ -0,0 +1,43 @@
+// Lazy lists(group members, groups of a profile): an element .lazy-next[data-next] is replaced by the
+// page at data-next - an HTML fragment, which ends with its own .lazy-next if there are more - when
+// it scrolls into view. A hidden list(.collapse) starts loading when it is shown.
+(function () {
+    if (!('IntersectionObserver' in window)) {
+        return;
+    }
+    var observer = new IntersectionObserver(function (entries) {
+        entries.forEach(function (entry) {
+            if (entry.isIntersecting) {
+                load(entry.target);
+            }
+        });
+    }, {rootMargin: '200px'});
+
+    function watch(root) {
+        root.querySelectorAll('.lazy-next').forEach(function (sentinel) {
+            observer.observe(sentinel);
+        });
+    }
+
+    function load(sentinel) {
+        observer.unobserve(sentinel);
+        var list = sentinel.parentNode;
+        fetch(sentinel.getAttribute('data-next'), {credentials: 'same-origin'})
+            .then(function (response) {
+                if (!response.ok) {
+                    throw new Error(response.status);
+                }
+                return response.text();
+            })
+            .then(function (html) {
+                sentinel.insertAdjacentHTML('beforebegin', html);
+                list.removeChild(sentinel);
+                watch(list);
+            })
+            .catch(function () {
+                observer.observe(sentinel); // try again the next time it comes into view
+            });
+    }
+
+    watch(document);
+})();
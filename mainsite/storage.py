@@ -0,0 +1,63 @@
+import gzip
+import hashlib
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.storage import FileSystemStorage
+
+try:
+    import brotli
+except ImportError: # optional, only .gz copies without it
+    brotli = None
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.html', '.txt', '.json', '.xml', '.map', '.ico')
+
+
+class ContentHashStorage(FileSystemStorage):
+    """
+    Names uploaded files by the sha1 of their content: <upload_to>/ab/abcdef...<ext>.
+    The same picture uploaded twice is stored once and the second upload writes nothing.
+    """
+    def save(self, name, content, max_length=None):
+        digest = hashlib.sha1()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        sha = digest.hexdigest()
+        ext = os.path.splitext(name)[1].lower()
+        name = os.path.join(os.path.dirname(name), sha[:2], sha + ext).replace('\\', '/')
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
+
+
+def precompress(path):
+    """Writes path.gz and path.br next to the file when they are smaller, returns how many were written."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    written = 0
+    copies = [('.gz', lambda: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        copies.append(('.br', lambda: brotli.compress(data)))
+    for suffix, compress in copies:
+        compressed = compress()
+        if len(compressed) < len(data) * 0.95: # not worth a Content-Encoding otherwise
+            with open(path + suffix, 'wb') as f:
+                f.write(compressed)
+            written += 1
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    collectstatic stores every file also as name.<md5[:12]>.ext and precompresses the text ones,
+    see assets.py. A name missing from the manifest gets its plain url instead of an error.
+    """
+    manifest_strict = False
+
+    def post_process(self, paths, dry_run=False, **options):
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if not dry_run and hashed_name and not isinstance(processed, Exception) and \
+                    hashed_name.lower().endswith(COMPRESSIBLE):
+                precompress(self.path(hashed_name))
+            yield name, hashed_name, processed
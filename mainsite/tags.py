@@ -0,0 +1,89 @@
+"""
+Tag pages and tag clouds.
+
+The posts of a tag are listed from PostTag, the table of Post.tags with a copy of post.date_pub:
+every page is one range scan over its (tag, date_pub, post) index and the cards of the page.
+
+The clouds are read from TagCount, the number of posts per tag in every group and on the whole
+site(group=None). The receivers in signals.py change it with F() updates whenever Post.tags changes
+or a post is deleted; rebuild_tag_counts() recounts everything after bulk inserts, which send no
+signals(python manage.py rebuild_tag_counts).
+"""
+import math
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+
+from .models import Post, PostTag, TagCount
+from .pagination import KeysetPaginator
+
+CLOUD_SIZE = 30
+CLOUD_FONT = (0.8, 1.8) # em, of the least and of the most used tag of a cloud
+
+
+def change_tag_counts(rows, delta):
+    """rows: (tag_id, group_id) of the PostTag rows just added(delta 1) or removed(delta -1)."""
+    counts = Counter()
+    for tag_id, group_id in rows:
+        counts[tag_id, group_id] += delta
+        counts[tag_id, None] += delta
+    # an UPDATE per group and change instead of one per tag: the tags of a post go in one
+    tags = defaultdict(list)
+    for (tag_id, group_id), change in counts.items():
+        tags[group_id, change].append(tag_id)
+    for (group_id, change), tag_ids in tags.items():
+        counted = TagCount.objects.filter(group_id=group_id, tag_id__in=tag_ids)
+        if counted.update(count=F('count') + change) < len(tag_ids) and change > 0:
+            missing = set(tag_ids) - set(counted.values_list('tag_id', flat=True))
+            TagCount.objects.bulk_create([TagCount(tag_id=tag_id, group_id=group_id, count=change)
+                                          for tag_id in missing], ignore_conflicts=True)
+
+
+def rebuild_tag_counts():
+    """Copies the post dates into PostTag and recounts TagCount, returns the number of TagCount rows."""
+    rows = PostTag.objects.order_by()
+    with transaction.atomic():
+        rows.update(date_pub=Subquery(Post.objects.filter(pk=OuterRef('post_id')).values('date_pub')[:1]))
+        TagCount.objects.all().delete()
+        site = rows.values('tag_id').annotate(count=Count('*')).values_list('tag_id', 'count')
+        groups = rows.values('tag_id', 'post__group_id').annotate(count=Count('*')).values_list(
+            'tag_id', 'post__group_id', 'count')
+        counts = [TagCount(tag_id=tag_id, group_id=None, count=count) for tag_id, count in site.iterator()]
+        counts += [TagCount(tag_id=tag_id, group_id=group_id, count=count)
+                   for tag_id, group_id, count in groups.iterator()]
+        TagCount.objects.bulk_create(counts, batch_size=500)
+    return len(counts)
+
+
+def tag_cloud(group=None, size=CLOUD_SIZE):
+    """
+    The size most used tags of the group(of the site without it) by title, with .count and .font
+    - the font size for style="font-size: ...", on a log scale between CLOUD_FONT.
+    """
+    counts = list(TagCount.objects.filter(group=group, count__gt=0).select_related('tag')
+                  .order_by('-count', 'tag_id')[:size])
+    if not counts:
+        return []
+    low, high = math.log(counts[-1].count), math.log(counts[0].count)
+    tags = []
+    for counted in counts:
+        tag = counted.tag
+        tag.count = counted.count
+        share = (math.log(counted.count) - low) / (high - low) if high > low else 0
+        tag.font = '%.2fem' % (CLOUD_FONT[0] + share * (CLOUD_FONT[1] - CLOUD_FONT[0]))
+        tags.append(tag)
+    return sorted(tags, key=lambda tag: tag.title.lower())
+
+
+class TagPaginator(KeysetPaginator):
+    """Keyset pages of the posts of the tag: the cursors are of PostTag(date_pub, post_id) rows."""
+    def __init__(self, tag, per_page):
+        super().__init__(PostTag.objects.filter(tag=tag).only('date_pub', 'post_id'), per_page, tiebreak='post_id')
+
+    def get_page(self, page=None, after=None, before=None):
+        page = super().get_page(page=page, after=after, before=before)
+        # the same date_pub and pk, so cursor_for() gives the same cursors for the posts
+        posts = Post.objects.cards().in_bulk([row.post_id for row in page.object_list])
+        page.object_list = [posts[row.post_id] for row in page.object_list if row.post_id in posts]
+        return page
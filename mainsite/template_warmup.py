@@ -0,0 +1,31 @@
+"""
+Compiles every template of every engine once at startup, so that the first requests of a worker
+do not pay for it: the cached loader(TEMPLATE_CACHE=1) and jinja2 keep the compiled ones.
+"""
+import os
+
+from django.template import engines
+from django.template.backends.django import DjangoTemplates
+from django.template.utils import get_app_template_dirs
+
+
+def template_names(engine):
+    dirs = list(engine.template_dirs)
+    if isinstance(engine, DjangoTemplates): # the app_directories loader reads them even with APP_DIRS off
+        dirs += [str(path) for path in get_app_template_dirs('templates') if str(path) not in dirs]
+    names = []
+    for directory in dirs:
+        for root, _, files in os.walk(directory):
+            names += [os.path.relpath(os.path.join(root, name), directory).replace(os.sep, '/') for name in files]
+    return names
+
+
+def warm_up():
+    """Returns {engine alias: number of templates compiled}."""
+    loaded = {}
+    for engine in engines.all():
+        names = template_names(engine)
+        for name in names:
+            engine.get_template(name)
+        loaded[engine.name] = len(names)
+    return loaded
@@ -0,0 +1,38 @@
+from time import perf_counter
+
+from django import template
+
+from mainsite.fragments import fragment_key, get_fragment, set_fragment
+
+register = template.Library()
+
+
+class FragmentNode(template.Node):
+    def __init__(self, nodelist, name, objects):
+        self.nodelist = nodelist
+        self.name = name
+        self.objects = objects
+
+    def render(self, context):
+        name = self.name.resolve(context)
+        key = fragment_key(name, [obj.resolve(context) for obj in self.objects])
+        content = get_fragment(name, key)
+        if content is None:
+            start = perf_counter()
+            content = self.nodelist.render(context)
+            set_fragment(name, key, content, perf_counter() - start)
+        return content
+
+
+@register.tag
+def fragment(parser, token):
+    """
+    {% fragment "post_card" post post.author %} ... {% endfragment %}
+    Caches the content until one of the objects changes(see mainsite/fragments.py).
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError("'fragment' tag requires a name and at least one object.")
+    nodelist = parser.parse(('endfragment',))
+    parser.delete_first_token()
+    return FragmentNode(nodelist, parser.compile_filter(bits[1]), [parser.compile_filter(bit) for bit in bits[2:]])
@@ -0,0 +1,22 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from mainsite.assets import media_url
+from mainsite.images import variant_exists, variant_name
+
+register = template.Library()
+
+
+@register.simple_tag
+def picture(photo, size, **attrs):
+    """
+    {% picture account.photo 'thumb' class='userimg' %} -> <picture> with the WebP variant and the
+    JPEG one as <img>, or just the original while the variants are not built yet.
+    """
+    attributes = format_html_join('', ' {}="{}"', attrs.items())
+    webp, jpeg = variant_name(photo.name, size, 'webp'), variant_name(photo.name, size, 'jpg')
+    if not (variant_exists(webp) and variant_exists(jpeg)):
+        return format_html('<img src="{}"{}>', media_url(photo.name), attributes)
+    return format_html(
+        '<picture><source srcset="{}" type="image/webp"><img src="{}"{}></picture>',
+        media_url(webp), media_url(jpeg), attributes)
@@ -1,3 +1,1165 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import re
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.conf import settings
+from django.db.migrations.executor import MigrationExecutor
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+
+from my_context_processors import menu
+from utils import slugify, slugify_many
+
+from .counters import get_group_count, repair_group_counters
+from . import metrics
+from .forms import GroupForm, PostForm, UserCreationForm, UserEditForm
+from .fragments import fragment_stats
+from .images import build_variants, variant_name
+from .management.commands.bench_site import compare
+from .membership import group_ids, is_member
+from .models import Account, Group, Post, PostTag, Tag, TagCount, TagQuerySet, TimelineEntry
+from .search import TokenTableBackend, search
+from .slugs import GROUP_SLUG_RE, canonical
+from .tags import rebuild_tag_counts, tag_cloud
+from .template_warmup import warm_up
+from .templatetags.images import picture
+from .timeline import TimelinePaginator
+from .views import GroupView, PostView, ProfileInfo
+from . import transfer
+
+User = get_user_model()
+
+
+def make_account(username, **kwargs):
+    user = User.objects.create_user(username=username, password='secret', first_name=username, **kwargs)
+    return Account.objects.create(user=user)
+
+
+def query_plan(queryset):
+    with connection.cursor() as cursor:
+        sql, params = queryset.query.sql_with_params()
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return ' '.join(str(row) for row in cursor.fetchall())
+
+
+class GroupViewQueriesTest(TestCase):
+    def setUp(self):
+        self.author = make_account('author')
+        self.group = Group.objects.create(name='Профсоюз', slug='union')
+        self.group.owners.add(self.author, make_account('member'))
+        self.tags = [Tag.objects.create(title=title) for title in ('один', 'два')]
+
+    def add_posts(self, count):
+        start = Post.objects.count()
+        for i in range(start, start + count):
+            post = Post.objects.create(title='Пост %d' % i, author=self.author, group=self.group, body='text')
+            post.tags.add(*self.tags)
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.group.get_absolute_url())
+        self.assertEqual(response.status_code, 200)
+        return len(ctx)
+
+    def test_query_count_does_not_depend_on_posts(self):
+        self.add_posts(2)
+        few = self.count_queries()
+        self.add_posts(10)
+        self.assertEqual(self.count_queries(), few)
+
+    def test_keyset_pages_cover_every_post_once(self):
+        self.add_posts(25)
+        seen = []
+        response = self.client.get(self.group.get_absolute_url())
+        while True:
+            page = response.context['page_obj']
+            seen.extend(post.pk for post in page)
+            if not page.has_next():
+                break
+            response = self.client.get(self.group.get_absolute_url(), {'after': page.next_cursor()})
+        expected = list(Post.objects.order_by('-date_pub', '-id').values_list('pk', flat=True))
+        self.assertEqual(seen, expected)
+
+        last = self.client.get(self.group.get_absolute_url(), {'page': 'last'}).context['page_obj']
+        self.assertEqual([post.pk for post in last], expected[-10:])
+        previous = self.client.get(self.group.get_absolute_url(), {'before': last.previous_cursor()})
+        self.assertEqual([post.pk for post in previous.context['page_obj']], expected[5:15])
+
+
+class GroupCountTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_counter_follows_create_and_delete(self):
+        Group.objects.create(name='a', slug='a')
+        self.assertEqual(get_group_count(), 1)
+        group = Group.objects.create(name='b', slug='b')
+        with self.assertNumQueries(0):
+            self.assertEqual(get_group_count(), 2)
+        group.delete()
+        self.assertEqual(get_group_count(), 1)
+
+    def test_context_processor_is_lazy(self):
+        with self.assertNumQueries(0):
+            context = menu.main(RequestFactory().get('/'))
+        with self.assertNumQueries(1):
+            self.assertEqual(context['groupcount'](), 0)
+
+
+class SearchTest(TestCase):
+    backend = None
+
+    def setUp(self):
+        if self.backend:
+            patcher = mock.patch('mainsite.search.get_backend', return_value=self.backend())
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        author = make_account('author')
+        self.group = Group.objects.create(name='Тигры', slug='tigers', description='Про больших кошек')
+        self.in_title = Post.objects.create(title='Амурский тигр', body='Живёт в тайге', author=author, group=self.group)
+        self.in_body = Post.objects.create(title='Кошки', body='Тигр тоже кошка', author=author, group=self.group)
+
+    def test_cyrillic_and_latin_queries_match(self):
+        self.assertEqual(search('тигр', 'post'), search('TIGR', 'post'))
+        self.assertEqual(search('тигр', 'post'), [('post', self.in_title.pk), ('post', self.in_body.pk)])
+        self.assertEqual(search('кошек'), [('group', self.group.pk)])
+
+    def test_index_follows_save_and_delete(self):
+        self.in_body.body = 'Лев'
+        self.in_body.save()
+        self.assertEqual(search('тигр'), [('post', self.in_title.pk)])
+        self.in_title.delete()
+        self.assertEqual(search('тигр'), [])
+
+    def test_search_view(self):
+        response = self.client.get('/search/', {'search': 'тигр тайге'})
+        self.assertEqual(response.context['results'], [('post', self.in_title)])
+
+
+class TokenTableSearchTest(SearchTest):
+    backend = TokenTableBackend
+
+
+class PostTagsTest(TestCase):
+    def setUp(self):
+        self.author = make_account('author')
+        self.group = Group.objects.create(name='Профсоюз', slug='union')
+
+    def create_post(self, tags):
+        form = PostForm({'title': 'Пост %d' % Post.objects.count(), 'body': '', 'tags': tags})
+        self.assertTrue(form.is_valid())
+        return form.save(author=self.author, group=self.group)
+
+    def test_query_count_does_not_depend_on_tags(self):
+        Tag.objects.create(title='tag0')
+        self.create_post('') # the first post also creates the slug sequence
+        with CaptureQueriesContext(connection) as few:
+            self.create_post('tag0, tag1')
+        with CaptureQueriesContext(connection) as many:
+            post = self.create_post(', '.join('tag%d' % i for i in range(20)))
+        self.assertEqual(len(many), len(few))
+        self.assertEqual(post.tags.count(), 20)
+
+    def test_titles_are_deduplicated_by_slug(self):
+        existing = Tag.objects.create(title='Тег')
+        post = self.create_post('тег, ТЕГ , Новый, новый,  , ###')
+        self.assertEqual([tag.slug for tag in post.tags.order_by('slug')], ['novij', 'teg'])
+        self.assertIn(existing, post.tags.all())
+
+    def test_tag_created_concurrently_is_reused(self):
+        real_bulk_create = TagQuerySet.bulk_create
+
+        def racing_bulk_create(queryset, objs, **kwargs): # another request inserts the tag first
+            Tag.objects.create(title='Гонка')
+            return real_bulk_create(queryset, objs, **kwargs)
+
+        with mock.patch.object(TagQuerySet, 'bulk_create', racing_bulk_create):
+            tags = Tag.objects.resolve(['гонка'])
+        self.assertEqual([tag.slug for tag in tags], ['gonka'])
+        self.assertEqual(Tag.objects.count(), 1)
+
+
+class FragmentCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = make_account('author')
+        self.group = Group.objects.create(name='Профсоюз', slug='union')
+        self.group.owners.add(self.author)
+        self.post = Post.objects.create(title='Пост', author=self.author, group=self.group)
+        self.client.force_login(self.author.user) # anonymous visitors get the whole page from the cache
+
+    def render_group(self):
+        return self.client.get(self.group.get_absolute_url()).content.decode()
+
+    def test_second_render_hits_the_cache(self):
+        self.render_group()
+        before = fragment_stats()
+        self.render_group()
+        after = fragment_stats()
+        for name in ('group_members', 'post_card'):
+            self.assertEqual(after[name]['hits'], before[name]['hits'] + 1)
+            self.assertEqual(after[name]['misses'], before[name]['misses'])
+
+    def test_membership_and_tags_invalidate(self):
+        self.render_group()
+        self.group.owners.add(make_account('Новенький'))
+        self.post.add_tags(Tag.objects.resolve(['свежий']))
+        content = self.render_group()
+        self.assertIn('Новенький', content)
+        self.assertIn('свежий', content)
+
+    def test_user_rename_invalidates_profile_card(self):
+        url = self.author.get_absolute_url()
+        self.client.get(url)
+        self.author.user.first_name = 'Переименован'
+        self.author.user.save()
+        self.assertContains(self.client.get(url), 'Переименован')
+
+    def test_group_edit_writes_no_member_rows(self):
+        url = self.author.get_absolute_url()
+        self.client.get(url)
+        self.group.name = 'Новое имя'
+        with CaptureQueriesContext(connection) as ctx:
+            self.group.save()
+        self.assertFalse([q['sql'] for q in ctx if 'mainsite_account' in q['sql']])
+        self.assertContains(self.client.get(url), 'Новое имя') # the profile card is keyed on its groups
+
+    def test_login_touches_nothing(self):
+        self.render_group()
+        before = fragment_stats()
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.login(username='author', password='secret') # saves last_login only
+        self.assertFalse([q['sql'] for q in ctx if 'mainsite_' in q['sql']])
+        self.render_group()
+        self.assertEqual(fragment_stats()['post_card']['misses'], before['post_card']['misses'])
+        self.assertEqual(fragment_stats()['group_members']['misses'], before['group_members']['misses'])
+
+    def test_only_the_first_name_touches_the_groups(self):
+        updated_at = Group.objects.get(pk=self.group.pk).updated_at
+        user = self.author.user
+        user.last_name = 'Фамилия'
+        user.save()
+        self.assertEqual(Group.objects.get(pk=self.group.pk).updated_at, updated_at)
+        self.assertContains(self.client.get(self.author.get_absolute_url()), 'Фамилия')
+        user.first_name = 'Имя'
+        user.save()
+        self.assertGreater(Group.objects.get(pk=self.group.pk).updated_at, updated_at)
+
+    def test_new_posts_keep_the_other_cards(self):
+        self.render_group()
+        before = fragment_stats()['post_card']['misses']
+        Post.objects.create(title='Ещё пост', author=self.author, group=self.group)
+        self.render_group()
+        self.assertEqual(fragment_stats()['post_card']['misses'], before + 1) # only the new one
+        self.group.name = 'Переименован'
+        self.group.save()
+        self.assertNotIn('Профсоюз</a>', self.render_group())
+
+
+class AnonymousPageCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = make_account('author')
+        self.group = Group.objects.create(name='Профсоюз', slug='union')
+        self.url = self.group.get_absolute_url()
+
+    def test_cached_page_and_conditional_get(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(1): # only the last-modified query
+            second = self.client.get(self.url)
+        self.assertEqual(second.content, first.content)
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_changes_purge_the_page(self):
+        etag = self.client.get(self.url)['ETag']
+        post = Post.objects.create(title='Новый пост', author=self.author, group=self.group)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Новый пост')
+        etag = response['ETag']
+        post.delete()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertNotContains(response, 'Новый пост')
+        etag = response['ETag']
+        self.group.owners.add(self.author)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_authenticated_users_are_not_cached(self):
+        self.client.force_login(self.author.user)
+        response = self.client.get(self.url)
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_group_page_follows_authors_who_left(self):
+        Post.objects.create(title='Пост', author=self.author, group=self.group) # not a member
+        etag = self.client.get(self.url)['ETag']
+        self.author.user.first_name = 'Переименован'
+        self.author.user.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Переименован')
+
+    def test_post_page_follows_the_group_and_the_author(self):
+        post = Post.objects.create(title='Пост', author=self.author, group=self.group)
+        url = post.get_absolute_url()
+        etag = self.client.get(url)['ETag']
+        self.group.name = 'Переименован'
+        self.group.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Переименован')
+        etag = response['ETag']
+        self.author.user.first_name = 'Автор'
+        self.author.user.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class ImageVariantsTest(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        override = self.settings(MEDIA_ROOT=media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def upload(self, color):
+        buffer = BytesIO()
+        Image.new('RGB', (1000, 600), color).save(buffer, 'JPEG')
+        return SimpleUploadedFile('Фото.JPG', buffer.getvalue(), content_type='image/jpeg')
+
+    def test_identical_uploads_are_stored_once(self):
+        first, second = make_account('first'), make_account('second')
+        with mock.patch('mainsite.images.schedule_variants'):
+            first.photo = self.upload('red')
+            first.save()
+            second.photo = self.upload('red')
+            second.save()
+        self.assertEqual(first.photo.name, second.photo.name)
+        self.assertTrue(first.photo.name.startswith('users/') and first.photo.name.endswith('.jpg'))
+
+    def test_variants_are_built_and_picked(self):
+        account = make_account('first')
+        with mock.patch('mainsite.images.schedule_variants') as schedule:
+            account.photo = self.upload('blue')
+            account.save()
+        schedule.assert_called_once_with(account.photo.name)
+        self.assertIn('<img src="%s"' % account.photo.url, picture(account.photo, 'thumb'))
+
+        self.assertEqual(build_variants(account.photo.name), 4)
+        self.assertEqual(build_variants(account.photo.name), 0)
+        with default_storage.open(variant_name(account.photo.name, 'thumb', 'webp')) as thumb:
+            self.assertEqual(Image.open(thumb).size, (80, 80))
+        html = picture(account.photo, 'thumb', **{'class': 'userimg'})
+        self.assertIn('_thumb.webp" type="image/webp"', html)
+        self.assertIn('_thumb.jpg" class="userimg">', html)
+
+    def test_transparent_images_keep_alpha_in_webp_and_get_white_in_jpeg(self):
+        image = Image.new('RGBA', (200, 200), (0, 0, 0, 0))
+        image.paste((200, 0, 0, 255), (50, 50, 150, 150))
+        buffer = BytesIO()
+        image.save(buffer, 'PNG')
+        name = default_storage.save('logo.png', ContentFile(buffer.getvalue()))
+        build_variants(name)
+        with default_storage.open(variant_name(name, 'thumb', 'webp')) as webp:
+            webp = Image.open(webp)
+            self.assertEqual(webp.mode, 'RGBA')
+            self.assertEqual(webp.getpixel((0, 0))[3], 0)
+        with default_storage.open(variant_name(name, 'thumb', 'jpg')) as jpg:
+            self.assertGreater(min(Image.open(jpg).getpixel((0, 0))), 245) # white, not black
+
+
+class GroupCountersTest(TestCase):
+    def setUp(self):
+        self.accounts = [make_account('user%d' % i) for i in range(3)]
+        self.group = Group.objects.create(name='Профсоюз', slug='union')
+        self.other = Group.objects.create(name='Другой', slug='other')
+
+    def counters(self, group):
+        group.refresh_from_db()
+        return group.member_count, group.post_count, group.last_post_at
+
+    def test_membership_from_both_sides(self):
+        self.group.owners.add(*self.accounts)
+        self.accounts[0].groups.add(self.other)
+        self.assertEqual(self.counters(self.group)[0], 3)
+        self.group.owners.add(self.accounts[0]) # already a member
+        self.group.owners.remove(self.accounts[1], make_account('stranger'))
+        self.assertEqual(self.counters(self.group)[0], 2)
+        self.accounts[0].groups.clear()
+        self.assertEqual(self.counters(self.group)[0], 1)
+        self.assertEqual(self.counters(self.other)[0], 0)
+        self.group.owners.clear()
+        self.assertEqual(self.counters(self.group)[0], 0)
+
+    def test_deleted_members(self):
+        self.group.owners.add(*self.accounts)
+        self.accounts[1].groups.add(self.other)
+        updated_at = Group.objects.get(pk=self.group.pk).updated_at
+        self.accounts[0].user.delete() # the account and its rows go with the cascade
+        self.accounts[1].delete()
+        self.assertEqual(self.counters(self.group)[0], 1)
+        self.assertEqual(self.counters(self.other)[0], 0)
+        self.assertGreater(self.group.updated_at, updated_at) # the members strip
+
+    def test_posts(self):
+        first = Post.objects.create(title='Первый', author=self.accounts[0], group=self.group)
+        second = Post.objects.create(title='Второй', author=self.accounts[0], group=self.group)
+        self.assertEqual(self.counters(self.group)[1:], (2, second.date_pub))
+        second.delete()
+        self.assertEqual(self.counters(self.group)[1:], (1, first.date_pub))
+        first.delete()
+        self.assertEqual(self.counters(self.group)[1:], (0, self.group.date_create))
+
+    def test_group_edit_does_not_overwrite_counters(self):
+        stale = Group.objects.get(pk=self.group.pk)
+        self.group.owners.add(*self.accounts)
+        stale.name = 'Новое имя'
+        stale.save()
+        self.assertEqual(self.counters(self.group)[0], 3)
+
+    def test_repair_and_sort_modes(self):
+        self.group.owners.add(*self.accounts)
+        Post.objects.create(title='Пост', author=self.accounts[0], group=self.other)
+        Group.objects.update(member_count=100, post_count=100, last_post_at=timezone.now())
+        repair_group_counters()
+        self.assertEqual(self.counters(self.group), (3, 0, self.group.date_create))
+        self.assertEqual(self.counters(self.other)[:2], (0, 1))
+        groups = self.client.get('/group/list/', {'sort': 'popular'}).context['groups']
+        self.assertEqual(list(groups), [self.group, self.other])
+        groups = self.client.get('/group/list/', {'sort': 'active'}).context['groups']
+        self.assertEqual(list(groups), [self.other, self.group])
+
+
+class MembershipTest(TestCase):
+    def setUp(self):
+        self.account = make_account('member')
+        self.group = Group.objects.create(name='Профсоюз', slug='union')
+        self.group.owners.add(self.account)
+        self.request = RequestFactory().get('/')
+        self.request.user = self.account.user
+
+    def test_checks_are_memoized(self):
+        other = Group.objects.create(name='Другой', slug='other')
+        with self.assertNumQueries(2):
+            self.assertTrue(is_member(self.request, self.group))
+            self.assertTrue(is_member(self.request, self.group))
+            self.assertFalse(is_member(self.request, other))
+        with self.assertNumQueries(1):
+            self.assertEqual(group_ids(self.request), {self.group.pk})
+            self.assertFalse(is_member(self.request, other))
+
+    def test_owner_check_does_not_load_groups(self):
+        self.client.force_login(self.account.user)
+        url = reverse('post_create', kwargs={'slug': self.group.slug})
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        for i in range(10):
+            Group.objects.create(name='g%d' % i, slug='g%d' % i).owners.add(self.account)
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(url)
+        self.assertEqual(len(many), len(few))
+        stranger = make_account('stranger')
+        self.client.force_login(stranger.user)
+        self.assertRedirects(self.client.get(url), self.group.get_absolute_url())
+
+    def test_group_page_does_not_load_members_for_the_flag(self):
+        self.client.force_login(self.account.user)
+        self.client.get(self.group.get_absolute_url()) # fills the fragment cache
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.group.get_absolute_url())
+        self.assertTrue(response.context['is_member'])
+        self.assertFalse(any('"mainsite_account_groups"."account_id" IN' in query['sql'] or
+                             'INNER JOIN "mainsite_account_groups" ON ("mainsite_account"' in query['sql']
+                             for query in ctx))
+
+
+class TimelineTest(TestCase):
+    def setUp(self):
+        self.reader, self.author = make_account('reader'), make_account('author')
+        self.small = Group.objects.create(name='Малый', slug='small')
+        self.big = Group.objects.create(name='Большой', slug='big')
+        self.small.owners.add(self.reader, self.author)
+        self.big.owners.add(self.reader, self.author, make_account('third'))
+
+    def post(self, group, title):
+        return Post.objects.create(title=title, author=self.author, group=group)
+
+    def feed(self, account, **params):
+        page = TimelinePaginator(account, 3).get_page(**params)
+        return [post.title for post in page], page
+
+    def test_fan_out_join_and_leave(self):
+        self.post(self.small, 'один')
+        self.assertEqual(TimelineEntry.objects.filter(account=self.reader).count(), 1)
+        newcomer = make_account('newcomer')
+        self.assertEqual(self.feed(newcomer)[0], [])
+        self.small.owners.add(newcomer)
+        self.assertEqual(self.feed(newcomer)[0], ['один'])
+        newcomer.groups.remove(self.small)
+        self.assertEqual(self.feed(newcomer)[0], [])
+
+    def test_big_groups_are_read_on_the_fly_and_pages_follow_cursors(self):
+        with mock.patch('mainsite.timeline.FANOUT_LIMIT', 2):
+            titles = [self.post(group, 'p%d' % i).title
+                      for i, group in enumerate([self.small, self.big] * 4)]
+            self.assertFalse(TimelineEntry.objects.filter(group=self.big).exists())
+            seen, page = self.feed(self.reader)
+            while page.has_next():
+                more, page = self.feed(self.reader, after=page.next_cursor())
+                seen += more
+        self.assertEqual(seen, titles[::-1])
+
+    def test_big_groups_are_read_a_page_at_a_time(self):
+        copied = self.post(self.big, 'до') # fanned out while the group was small
+        with mock.patch('mainsite.timeline.FANOUT_LIMIT', 2):
+            for i in range(10):
+                self.post(self.big, 'p%d' % i)
+            with CaptureQueriesContext(connection) as ctx:
+                titles, page = self.feed(self.reader, after=TimelinePaginator(self.reader, 3).cursor_for(
+                    Post.objects.get(title='p2')))
+        self.assertEqual(titles, ['p1', 'p0', 'до'])
+        self.assertFalse(page.has_next())
+        self.assertTrue(TimelineEntry.objects.filter(account=self.reader, post=copied).exists())
+        feeds = [query['sql'] for query in ctx if 'FROM "mainsite_post" ' in query['sql'] and 'group_id" IN' in query['sql']]
+        self.assertEqual(len(feeds), 1)
+        self.assertIn('LIMIT 4', feeds[0])
+
+    def test_main_page_shows_the_timeline(self):
+        self.post(self.small, 'Новость')
+        self.client.force_login(self.reader.user)
+        self.assertContains(self.client.get('/'), 'Новость')
+
+
+class MigrationUpgradeTest(TransactionTestCase):
+    # a database made by makemigrations from the models before the migrations were committed
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.migrate(target)
+        return executor.loader.project_state(target).apps
+
+    def test_baseline_database_is_upgraded(self):
+        old = self.migrate([('mainsite', '0001_initial')])
+        user = old.get_model('auth', 'User').objects.create(username='ivan', email='Ivan@Example.com',
+                                                            last_login=timezone.now())
+        account = old.get_model('mainsite', 'Account').objects.create(user_id=user.pk)
+        group = old.get_model('mainsite', 'Group').objects.create(name='Профсоюз', slug='Union')
+        account.groups.add(group)
+        old.get_model('mainsite', 'Post').objects.create(title='Пост', slug='Post.1558861234', body='текст ' * 200,
+                                                         author_id=account.pk, group_id=group.pk)
+        executor = MigrationExecutor(connection)
+        self.migrate(executor.loader.graph.leaf_nodes())
+
+        group = Group.objects.get()
+        post = Post.objects.get()
+        self.assertEqual((group.slug, group.member_count, group.post_count, group.last_post_at),
+                         ('union', 1, 1, post.date_pub))
+        self.assertEqual(post.slug, 'post.1558861234')
+        self.assertTrue(post.excerpt.endswith('…') and len(post.excerpt) == 700)
+        self.assertTrue(post.body_html.startswith('<p>текст'))
+        self.assertEqual(list(TimelineEntry.objects.values_list('post_id', flat=True)), [post.pk])
+        self.assertEqual(User.objects.get().email, 'ivan@example.com')
+
+
+class SlugTest(TestCase):
+    def setUp(self):
+        self.author = make_account('author')
+
+    def test_same_title_same_second(self):
+        group = Group.objects.create(name='Профсоюз', slug='union')
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now()):
+            first = Post.objects.create(title='Привет', author=self.author, group=group)
+            second = Post.objects.create(title='Привет', author=self.author, group=group)
+        self.assertNotEqual(first.slug, second.slug)
+        self.assertTrue(first.slug.startswith('privet-'))
+        self.assertTrue(Post.objects.create(title='???', author=self.author, group=group).slug.startswith('post-'))
+
+    def test_group_is_written_once(self):
+        with CaptureQueriesContext(connection) as ctx:
+            group = Group.objects.create(name='Без ссылки')
+        writes = [q['sql'] for q in ctx if 'mainsite_group"' in q['sql'].split('SET')[0]
+                  and q['sql'].startswith(('INSERT', 'UPDATE'))]
+        self.assertEqual(len(writes), 1, writes)
+        self.assertRegex(group.slug, r'^g-[0-9a-z]+$')
+        self.assertEqual(Group.objects.create(name='Своя', slug='MyUnion').slug, 'myunion')
+
+    def test_lookups_are_exact_on_the_canonical_slug(self):
+        group = Group.objects.create(name='Профсоюз', slug='Union')
+        post = Post.objects.create(title='Пост', author=self.author, group=group)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/post/%s/' % post.slug.upper())
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any('LIKE' in query['sql'] for query in ctx))
+
+    def test_generated_slugs_are_reserved_in_the_form(self):
+        form = GroupForm({'name': 'x', 'slug': 'G-1'})
+        self.assertFalse(form.is_valid())
+        self.assertIn('slug', form.errors)
+
+
+class PostDetailTest(TestCase):
+    def setUp(self):
+        self.author = make_account('author')
+        self.group = Group.objects.create(name='Профсоюз', slug='union')
+        self.post = Post.objects.create(title='Пост', author=self.author, group=self.group,
+                                        body='<b>жирный</b>\nсм. https://example.com\n\nвторой абзац')
+        self.post.add_tags(Tag.objects.resolve(['раз', 'два']))
+        self.client.force_login(self.author.user) # past the page cache
+
+    def test_body_is_rendered_on_save(self):
+        html = Post.objects.get(pk=self.post.pk).body_html
+        self.assertIn('&lt;b&gt;', html)
+        self.assertIn('<a href="https://example.com" rel="nofollow">', html)
+        self.assertEqual(html.count('<p>'), 2)
+
+    def test_post_queries(self):
+        url = self.post.get_absolute_url()
+        self.assertEqual(url, '/post/%s/' % self.post.slug)
+        self.client.get(url) # session and user
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertContains(response, 'rel="nofollow"')
+        self.assertContains(response, '<li>', count=2)
+        post_queries = [q['sql'] for q in ctx if 'FROM "mainsite_post"' in q['sql']]
+        tag_queries = [q['sql'] for q in ctx if 'FROM "mainsite_tag"' in q['sql']]
+        self.assertEqual(len(post_queries), 1, post_queries)
+        self.assertIn('INNER JOIN "mainsite_group"', post_queries[0])
+        self.assertEqual(len(tag_queries), 1, tag_queries)
+
+    def test_old_url_redirects(self):
+        response = self.client.get('/group/UNION/post/%s/' % self.post.slug.upper())
+        self.assertRedirects(response, self.post.get_absolute_url(), status_code=301)
+        self.assertEqual(self.client.get('/group/union/post/nope/').status_code, 404)
+
+
+@override_settings(
+    SESSION_ENGINE='django.contrib.sessions.backends.cached_db',
+    MIDDLEWARE=[name.replace('django.contrib.auth.middleware.AuthenticationMiddleware',
+                             'mainsite.middleware.CachedAuthenticationMiddleware') for name in settings.MIDDLEWARE],
+)
+class CachedAuthTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.account = make_account('reader')
+        self.client.force_login(self.account.user)
+
+    def queried_tables(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return ' '.join(q['sql'] for q in ctx)
+
+    def test_user_and_session_come_from_the_cache(self):
+        sql = self.queried_tables('/profile/')
+        self.assertIn('"auth_user"', sql) # the first request loads the user with the account
+        self.assertNotIn('FROM "mainsite_account"', sql)
+        sql = self.queried_tables('/profile/')
+        self.assertNotIn('"auth_user"', sql)
+        self.assertNotIn('"mainsite_account"', sql)
+        self.assertNotIn('"django_session"', sql)
+
+    def test_profile_edit_invalidates(self):
+        self.client.get('/profile/')
+        self.account.user.first_name = 'Новое имя'
+        self.account.user.save()
+        self.assertContains(self.client.get('/profile/'), 'Новое имя')
+        self.account.views = 'анархист'
+        self.account.save()
+        self.assertContains(self.client.get('/profile/'), 'анархист')
+
+    def test_password_change_logs_out_other_sessions(self):
+        self.client.get('/profile/')
+        self.account.user.set_password('another')
+        self.account.user.save()
+        self.assertRedirects(self.client.get('/profile/'), '/login/?next=/profile/', fetch_redirect_response=False)
+
+
+class DatabaseProfileTest(TestCase):
+    def test_sqlite_pragmas(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('sqlite only')
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS['busy_timeout'])
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1) # NORMAL
+
+
+TIMED_TEMPLATES = [dict(settings.TEMPLATES[0], BACKEND='mainsite.metrics.TimedDjangoTemplates')]
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_SAMPLE_RATE=1, TEMPLATES=TIMED_TEMPLATES)
+class MetricsTest(TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.account = make_account('reader')
+        self.group = Group.objects.create(name='Профсоюз', slug='union')
+        self.client.force_login(self.account.user)
+
+    def test_server_timing(self):
+        response = self.client.get(self.group.get_absolute_url())
+        self.assertRegex(response['Server-Timing'],
+                         r'^db;dur=[0-9.]+;desc="\d+ queries, \d+ repeated", tpl;dur=[0-9.]+, total;dur=[0-9.]+$')
+        self.assertNotIn('tpl;dur=0.0,', response['Server-Timing'])
+
+    def test_prometheus_histograms(self):
+        self.client.get(self.group.get_absolute_url())
+        self.client.get(self.group.get_absolute_url())
+        self.client.logout()
+        with self.settings(METRICS_TOKEN='s3cret'):
+            text = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer s3cret').content.decode()
+        self.assertIn('# TYPE vkommune_db_queries histogram', text)
+        self.assertIn('vkommune_request_duration_seconds_count{view="group_info"} 2', text)
+        self.assertIn('vkommune_db_queries_bucket{view="group_info",le="+Inf"} 2', text)
+
+    def test_repeated_queries(self):
+        stats = metrics.RequestStats()
+        for pk in (1, 2, 3):
+            stats.execute_wrapper(lambda *args: None, 'SELECT * FROM t WHERE id = %s', [pk], False, {})
+        stats.execute_wrapper(lambda *args: None, 'SELECT 1', [], False, {})
+        self.assertEqual((stats.queries, stats.repeated), (4, 2))
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_access(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404) # 127.0.0.1 alone means nothing
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 404)
+        self.account.user.is_staff = True
+        self.account.user.save()
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+        self.client.logout()
+        with self.settings(METRICS_TOKEN=''):
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer ').status_code, 404)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled(self):
+        self.assertNotIn('Server-Timing', self.client.get(self.group.get_absolute_url()))
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+
+class GenerateDataTest(TestCase):
+    def test_generated_data_is_consistent(self):
+        call_command('generate_data', accounts=30, groups=4, posts=60, tags=10, stdout=StringIO())
+        self.assertEqual(Account.objects.count(), 30)
+        self.assertEqual(Post.objects.count(), 60)
+        slugs = list(Post.objects.values_list('slug', flat=True))
+        self.assertEqual(len(set(slugs)), 60)
+        self.assertTrue(all(slug == slug.lower() for slug in slugs))
+        self.assertGreater(len(set(Post.objects.values_list('date_pub', flat=True))), 1)
+        counters = list(Group.objects.order_by('pk').values_list('member_count', 'post_count', 'last_post_at'))
+        repair_group_counters()
+        self.assertEqual(counters, list(Group.objects.order_by('pk').values_list('member_count', 'post_count', 'last_post_at')))
+        self.assertEqual(get_group_count(), 4)
+        account = Account.objects.filter(groups__post__isnull=False).first()
+        self.assertTrue(TimelineEntry.objects.filter(account=account).exists())
+        self.assertTrue(search(Post.objects.first().title))
+
+
+class BenchSiteTest(TestCase):
+    def test_compare(self):
+        baseline = {'main': {'queries': 5, 'p95_ms': 20.0, 'peak_kb': 100.0}}
+        self.assertEqual(compare({'main': {'queries': 5, 'p95_ms': 34.0, 'peak_kb': 150.0}}, baseline, 0.5), [])
+        regressions = compare({'main': {'queries': 6, 'p95_ms': 40.0, 'peak_kb': 100.0}}, baseline, 0.5)
+        self.assertEqual(len(regressions), 2)
+        self.assertIn('main: 6 queries, baseline 5', regressions)
+
+    def test_run_leaves_the_cache_alone(self):
+        cache.clear()
+        cache.set('marker', 1)
+        output = tempfile.NamedTemporaryFile(suffix='.json', delete=False)
+        output.close()
+        self.addCleanup(os.remove, output.name)
+        call_command('bench_site', accounts=10, groups=2, posts=20, repeat=1, output=output.name,
+                     baseline=output.name + '.missing', stderr=StringIO())
+        with open(output.name) as f:
+            self.assertEqual(json.load(f)['group_info']['status'], 200)
+        self.assertEqual(len(cache._cache), 1) # fragments, pages and the staff user went with the throwaway cache
+        self.assertEqual(cache.get('marker'), 1)
+
+
+class TransliterationTest(TestCase):
+    def test_russian_is_unchanged(self):
+        self.assertEqual(slugify('Привет, Мир!'), 'privet-mir')
+        self.assertEqual(slugify('ЁЖИК в тумане'), 'yozhik-v-tumane')
+        self.assertEqual(slugify('Щука и Цапля'), 'shchuka-i-tsaplya')
+
+    def test_other_letters(self):
+        self.assertEqual(slugify('Съезд, объём и соль'), 'sezd-obyom-i-sol')
+        self.assertEqual(slugify('Київ і Ґанок'), 'kiyiv-i-ganok')
+        self.assertEqual(slugify('Café ﬁne'), 'cafe-fine')
+        self.assertEqual(slugify('東京'), '東京')
+
+    def test_batch(self):
+        self.assertEqual(slugify_many(['Тег', 'тег', 'Другой']), ['teg', 'teg', 'drugoj'])
+        self.assertEqual(slugify('слово ' * 100), slugify_many(['слово ' * 100])[0]) # not cached
+
+
+class TransferTest(TestCase):
+    def setUp(self):
+        self.author = make_account('author', email='a@example.com')
+        self.group = Group.objects.create(name='Профсоюз', slug='union')
+        self.author.groups.add(self.group)
+        self.post = Post.objects.create(title='Пост', body='текст', author=self.author, group=self.group)
+        self.post.add_tags(Tag.objects.resolve(['раз', 'два']))
+
+    def export(self):
+        out = StringIO()
+        transfer.export(out, chunk_size=1)
+        return out.getvalue().splitlines()
+
+    def test_round_trip(self):
+        lines = self.export()
+        self.assertEqual([json.loads(line)['type'] for line in lines],
+                         ['account', 'group', 'tag', 'tag', 'membership', 'post'])
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        Tag.objects.all().delete()
+        transfer.import_lines(lines, chunk_size=2)
+        transfer.rebuild_derived()
+        self.assertEqual(self.export(), lines)
+        post = Post.objects.get(slug=self.post.slug)
+        self.assertEqual(post.date_pub, self.post.date_pub)
+        self.assertEqual(post.body_html, self.post.body_html)
+        self.assertEqual(Group.objects.get(slug='union').post_count, 1)
+        self.assertTrue(TimelineEntry.objects.filter(post=post).exists())
+        self.assertNotEqual(Post.objects.create(title='Пост', author=post.author, group=post.group).slug, post.slug)
+
+    def test_resume(self):
+        lines = self.export()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        Tag.objects.all().delete()
+        transfer.import_lines(lines[:4], source='old', chunk_size=1) # interrupted after the tags
+        committed = []
+        transfer.import_lines(lines, source='old', offset=3, chunk_size=1, progress=committed.append)
+        self.assertEqual(committed, [4, 5, 6])
+        self.assertEqual(Group.objects.count(), 1)
+        self.assertEqual(sorted(Post.objects.get().tags.values_list('slug', flat=True)), ['dva', 'raz'])
+        self.assertEqual(list(Group.objects.get().owners.values_list('user__username', flat=True)), ['author'])
+
+    def test_colliding_keys(self):
+        lines = self.export()
+        Post.objects.filter(pk=self.post.pk).update(title='Другой')
+        transfer.import_lines(lines, source='old')
+        self.assertEqual(Group.objects.count(), 2)
+        self.assertEqual(Post.objects.count(), 2)
+        group = Group.objects.exclude(pk=self.group.pk).get()
+        self.assertRegex(group.slug, GROUP_SLUG_RE)
+        post = Post.objects.exclude(pk=self.post.pk).get()
+        self.assertEqual((post.title, post.group), ('Пост', group))
+        self.assertNotEqual(post.slug, self.post.slug)
+        self.assertEqual(post.author.user.username, 'author-2')
+        self.assertEqual(list(group.owners.all()), [post.author])
+        self.assertEqual(Post.objects.get(pk=self.post.pk).title, 'Другой')
+        self.assertEqual(list(self.group.owners.all()), [self.author])
+        transfer.import_lines(lines, source='old') # again: nothing new
+        self.assertEqual((Group.objects.count(), Post.objects.count(), Account.objects.count()), (2, 2, 2))
+
+try:
+    import jinja2
+except ImportError: # optional, see JINJA2 in settings.py
+    jinja2 = None
+
+JINJA2_ENGINE = {
+    'BACKEND': 'django.template.backends.jinja2.Jinja2',
+    'NAME': 'jinja2',
+    'DIRS': [settings.BASE_DIR + '/jinja2'],
+    'APP_DIRS': False,
+    'OPTIONS': {'environment': 'mainsite.jinja2.environment', 'context_processors': ["my_context_processors.menu.main"]},
+}
+
+
+def page_text(response):
+    html = re.sub(r'badge-\w+', 'badge', response.content.decode()) # colors|random
+    return re.sub(r'\s+', ' ', html).strip()
+
+
+class TemplateEngineTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = make_account('author')
+        self.group = Group.objects.create(name='Профсоюз', slug='union', description='<i>описание</i>')
+        self.author.groups.add(self.group)
+        for i in range(12):
+            post = Post.objects.create(title='Пост %d' % i, author=self.author, group=self.group,
+                                       body='текст\n\nhttps://example.com')
+            post.add_tags(Tag.objects.resolve(['раз']))
+        self.client.force_login(self.author.user) # past the page cache
+
+    def test_warm_up_fills_the_cached_loader(self):
+        templates = [dict(settings.TEMPLATES[0], APP_DIRS=False, OPTIONS=dict(
+            settings.TEMPLATES[0]['OPTIONS'], loaders=[('django.template.loaders.cached.Loader', [
+                'django.template.loaders.filesystem.Loader', 'django.template.loaders.app_directories.Loader'])]))]
+        with override_settings(TEMPLATES=templates):
+            from django.template import engines
+            loaded = warm_up()
+            loader = engines['django'].engine.template_loaders[0]
+            self.assertEqual(set(loaded), {'django'})
+            self.assertIn('mainsite/group_info.html', loader.get_template_cache)
+            self.assertIn('admin/base.html', loader.get_template_cache) # app templates too
+
+    @skipUnless(jinja2, 'jinja2 is not installed')
+    def test_jinja2_pages_match_django(self):
+        urls = [self.group.get_absolute_url(), self.group.get_absolute_url() + '?page=last',
+                Post.objects.first().get_absolute_url(), reverse('profile', kwargs={'pk': self.author.user.pk})]
+        django_pages = [page_text(self.client.get(url)) for url in urls]
+        cache.clear() # the fragments
+        with override_settings(TEMPLATES=settings.TEMPLATES + [JINJA2_ENGINE]), \
+                mock.patch.object(GroupView, 'template_engine', 'jinja2'), \
+                mock.patch.object(PostView, 'template_engine', 'jinja2'), \
+                mock.patch.object(ProfileInfo, 'template_engine', 'jinja2'):
+            for url, django_page in zip(urls, django_pages):
+                response = self.client.get(url)
+                self.assertFalse(response.templates) # only django templates are recorded
+                self.assertEqual(page_text(response), django_page, url)
+
+
+class AssetsTest(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        override = self.settings(MEDIA_ROOT=media)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.name = 'users/ab/%s.png' % ('ab' * 20)
+        default_storage.save(self.name, BytesIO(bytes(range(256)) * 4))
+        default_storage.save('profile_logo.png', BytesIO(b'placeholder'))
+
+    def test_uploads_skip_the_other_middleware(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/uploads/' + self.name)
+        self.assertEqual(len(ctx), 0) # no session, no user
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(256)) * 4)
+        not_modified = self.client.get('/uploads/' + self.name, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(self.client.get('/uploads/users/missing.png').status_code, 404)
+        self.assertEqual(self.client.get('/uploads/../manage.py').status_code, 404)
+
+    def test_ranges(self):
+        response = self.client.get('/uploads/' + self.name, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(10, 20)))
+        response = self.client.get('/uploads/' + self.name, HTTP_RANGE='bytes=-4')
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(252, 256)))
+        response = self.client.get('/uploads/' + self.name, HTTP_RANGE='bytes=2000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+    def test_placeholders_get_a_versioned_url(self):
+        account = make_account('first')
+        html = picture(account.photo, 'thumb')
+        self.assertIn('/uploads/profile_logo.png?v=', html)
+        url = re.search(r'src="([^"]+)"', html).group(1)
+        self.assertEqual(self.client.get(url)['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(self.client.get('/uploads/profile_logo.png')['Cache-Control'], 'public, max-age=3600')
+        self.assertEqual(self.client.get('/uploads/profile_logo.png?v=anything')['Cache-Control'], 'public, max-age=3600')
+
+    def test_collectstatic_writes_hashed_and_compressed_files(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        with self.settings(STATIC_ROOT=root, STATICFILES_STORAGE='mainsite.storage.CompressedManifestStaticFilesStorage'):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            url = staticfiles_storage.url('css/style.css')
+            self.assertRegex(url, r'^/static/css/style\.[0-9a-f]{12}\.css$')
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(response['Content-Type'], 'text/css')
+            self.assertEqual(response['Vary'], 'Accept-Encoding')
+            self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+            with open(os.path.join(root, 'css', 'style.css'), 'rb') as f:
+                self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), f.read())
+            identity = self.client.get(url)
+            self.assertNotIn('Content-Encoding', identity)
+            self.assertNotEqual(identity['ETag'], response['ETag']) # the caches keep them apart
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=identity['ETag'],
+                                             HTTP_ACCEPT_ENCODING='gzip').status_code, 200)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'],
+                                             HTTP_ACCEPT_ENCODING='gzip').status_code, 304)
+            ranged = self.client.get(url, HTTP_RANGE='bytes=0-9', HTTP_ACCEPT_ENCODING='gzip')
+            self.assertEqual((ranged.status_code, ranged['ETag']), (206, identity['ETag']))
+            self.assertNotIn('Content-Encoding', ranged)
+
+
+class TagsTest(TestCase):
+    def setUp(self):
+        self.author = make_account('author')
+        self.group = Group.objects.create(name='Профсоюз', slug='union')
+        self.other = Group.objects.create(name='Другой', slug='other')
+        self.tags = Tag.objects.resolve(['раз', 'два', 'три'])
+        self.posts = [Post.objects.create(title='Пост %d' % i, author=self.author, group=self.group) for i in range(12)]
+
+    def counts(self):
+        return sorted(TagCount.objects.filter(count__gt=0).values_list('tag__slug', 'group__slug', 'count'),
+                      key=str)
+
+    def test_counts_follow_the_tags(self):
+        one, two, three = self.tags
+        for post in self.posts:
+            post.add_tags([one])
+        self.posts[0].add_tags([one, two]) # one is there already
+        self.posts[1].tags.add(two, three)
+        three.posts.add(Post.objects.create(title='Другой пост', author=self.author, group=self.other))
+        self.posts[1].tags.remove(three, one)
+        two.posts.clear()
+        self.posts[2].delete()
+        expected = self.counts()
+        self.assertEqual(expected, [('raz', 'union', 10), ('raz', None, 10), ('tri', 'other', 1), ('tri', None, 1)])
+        self.assertEqual(rebuild_tag_counts(), 4)
+        self.assertEqual(self.counts(), expected)
+
+    def test_rows_get_the_post_date(self):
+        post = self.posts[0]
+        post.tags.add(self.tags[0])
+        self.tags[1].posts.add(post)
+        self.assertEqual(set(PostTag.objects.values_list('date_pub', flat=True)), {post.date_pub})
+        post.date_pub -= timezone.timedelta(days=10)
+        Post.objects.filter(pk=post.pk).update(date_pub=post.date_pub) # like the bulk updates of the imports
+        self.assertNotEqual(set(PostTag.objects.values_list('date_pub', flat=True)), {post.date_pub})
+        rebuild_tag_counts()
+        self.assertEqual(set(PostTag.objects.values_list('date_pub', flat=True)), {post.date_pub})
+
+    def test_tag_page(self):
+        tag = self.tags[0]
+        for post in self.posts:
+            post.add_tags([tag])
+        Post.objects.create(title='Без тэга', author=self.author, group=self.group)
+        response = self.client.get(tag.get_absolute_url())
+        self.assertEqual([post.pk for post in response.context['posts']], [post.pk for post in self.posts[::-1][:10]])
+        self.assertContains(response, '(постов: 12)')
+        self.assertContains(response, 'href="%s"' % tag.get_absolute_url())
+        response = self.client.get(tag.get_absolute_url(), {'after': response.context['page_obj'].next_cursor()})
+        self.assertEqual([post.pk for post in response.context['posts']], [self.posts[1].pk, self.posts[0].pk])
+        response = self.client.get(tag.get_absolute_url(), {'before': response.context['page_obj'].previous_cursor()})
+        self.assertEqual(len(response.context['posts']), 10)
+        self.assertEqual(self.client.get('/tag/missing/').status_code, 404)
+
+    def test_tag_page_reads_the_index(self):
+        plan = query_plan(PostTag.objects.filter(tag=self.tags[0]).order_by('-date_pub', '-post_id')[:11])
+        self.assertIn('tag_posts_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan) # no sort
+
+    def test_clouds(self):
+        one, two, three = self.tags
+        for post in self.posts[:8]:
+            post.add_tags([one])
+        self.posts[0].add_tags([two])
+        Post.objects.create(title='Другой', author=self.author, group=self.other).add_tags([three])
+        self.assertEqual([(tag.slug, tag.count, tag.font) for tag in tag_cloud(self.group)],
+                         [('dva', 1, '0.80em'), ('raz', 8, '1.80em')])
+        self.assertEqual([tag.slug for tag in tag_cloud()], ['dva', 'raz', 'tri'])
+        self.client.force_login(self.author.user) # past the page cache
+        self.assertContains(self.client.get(self.group.get_absolute_url()), 'style="font-size: 1.80em;"')
+        response = self.client.get(reverse('tag_list'))
+        self.assertContains(response, 'href="%s"' % three.get_absolute_url())
+        with CaptureQueriesContext(connection) as ctx:
+            tag_cloud(self.group)
+        self.assertEqual(len(ctx), 1)
+
+
+class MembersTest(TestCase):
+    def setUp(self):
+        cache.clear() # the fragments
+        self.group = Group.objects.create(name='Профсоюз', slug='union')
+        self.accounts = [make_account('member%d' % i) for i in range(30)]
+        for account in self.accounts:
+            account.groups.add(self.group)
+        self.url = reverse('group_members', kwargs={'slug': 'union'})
+
+    def names(self, html):
+        return re.findall(r'>(member\d+)</span>', html)
+
+    def follow(self, url):
+        names = []
+        while url:
+            response = self.client.get(url)
+            names += self.names(response.content.decode())
+            url = (re.findall(r'data-next="([^"]+)"', response.content.decode()) or [None])[0]
+        return names
+
+    @mock.patch('mainsite.members.PAGE', 7)
+    def test_header_shows_the_preview_and_the_rest_is_paged(self):
+        html = self.client.get(self.group.get_absolute_url()).content.decode()
+        newest = ['member%d' % i for i in range(29, -1, -1)]
+        self.assertEqual(self.names(html), newest[:12])
+        rest = re.search(r'data-next="([^"]+)"', html).group(1)
+        self.assertEqual(self.follow(rest), newest[12:])
+        self.assertEqual(self.follow(self.url), newest)
+
+    def test_page_queries_do_not_grow(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url)
+        self.assertEqual(len(self.names(response.content.decode())), 30)
+        self.assertEqual(len(ctx), 2) # the group and the page with the accounts and users
+        self.assertNotIn('data-next', response.content.decode())
+        self.assertEqual(self.client.get(self.url, {'after': 'x'}).status_code, 404)
+        self.assertEqual(self.client.get('/group/missing/members/').status_code, 404)
+
+    def test_json(self):
+        data = self.client.get(self.url, {'format': 'json'}).json()
+        self.assertIsNone(data['next'])
+        self.assertEqual(data['members'][0]['name'], 'member29')
+        self.assertEqual(data['members'][0]['url'], reverse('profile', kwargs={'pk': self.accounts[29].user_id}))
+
+    def test_profile_groups(self):
+        account = self.accounts[0]
+        for i in range(15):
+            account.groups.add(Group.objects.create(name='Группа %d' % i, slug='g%d' % i))
+        url = reverse('profile_groups', kwargs={'pk': account.user_id})
+        self.assertEqual(self.client.get(url).status_code, 302) # login first, like the profile
+        self.client.force_login(account.user)
+        html = self.client.get(reverse('profile', kwargs={'pk': account.user_id})).content.decode()
+        card = html[html.index('Профсоюзы:'):html.index('Был онлайн')]
+        self.assertEqual(card.count('href="/group/'), 12)
+        rest = re.search(r'data-next="([^"]+)"', html).group(1)
+        data = self.client.get(rest, HTTP_ACCEPT='application/json').json()
+        self.assertEqual([group['name'] for group in data['groups']], ['Группа 2', 'Группа 1', 'Группа 0', 'Профсоюз'])
+
+    def test_pages_read_the_indexes(self):
+        plan = query_plan(Account.groups.through.objects.filter(group=self.group, pk__lt=100).order_by('-pk')[:49])
+        self.assertIn('membership_group_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class CaseInsensitiveLookupTest(TestCase):
+    def test_emails_are_stored_in_lowercase(self):
+        account = make_account('ivan', email='Ivan@Example.COM')
+        self.assertEqual(User.objects.get(pk=account.user_id).email, 'ivan@example.com')
+        form = UserCreationForm(data={'username': 'other', 'email': 'IVAN@example.com', 'first_name': 'a',
+                                      'last_name': 'b', 'password1': 'secret', 'password2': 'secret'})
+        self.assertIn('email', form.errors)
+        form = UserEditForm(instance=account.user, data={'username': 'ivan', 'email': 'IVAN@EXAMPLE.com',
+                                                         'first_name': 'a', 'last_name': 'b'})
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['email'], 'ivan@example.com')
+
+    def test_lookups_read_the_indexes(self):
+        make_account('ivan', email='ivan@example.com')
+        group = Group.objects.create(name='Профсоюз', slug='union')
+        tag = Tag.objects.create(title='Тег')
+        for queryset, index in (
+                (User.objects.filter(email='ivan@example.com').exclude(pk=1), 'user_email_idx'),
+                (Group.objects.filter(slug=canonical('UNION')), 'sqlite_autoindex_mainsite_group'), # unique=True
+                (Post.objects.filter(slug=canonical('Post-1')), 'sqlite_autoindex_mainsite_post'),
+                (Tag.objects.filter(slug__in=slugify_many(['Тег', 'ТЕГ '])), 'sqlite_autoindex_mainsite_tag')):
+            plan = query_plan(queryset)
+            self.assertIn('USING INDEX %s' % index, plan)
+            self.assertNotIn('SCAN', plan)
+        self.assertIn('SCAN', query_plan(User.objects.filter(email__iexact='ivan@example.com'))) # what it was
+        self.assertEqual(Group.objects.get(slug=canonical('UNION')), group)
+        self.assertEqual(list(Tag.objects.resolve(['ТЕГ '])), [tag])
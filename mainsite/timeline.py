@@ -0,0 +1,70 @@
+"""
+Home feed: recent posts from the groups of the account.
+
+A new post is copied into TimelineEntry of every member(fan-out on write), so reading the feed is
+one range scan over the (account, date_pub) index. Groups with more than TIMELINE_FANOUT_LIMIT
+members are not copied - their posts are read on the fly, one page of them, and merged into the page.
+Joining a group backfills its latest posts, leaving it drops them.
+"""
+from django.conf import settings
+from django.db.models import Q
+from django.http import Http404
+
+from .models import Account, Group, Post, TimelineEntry
+from .pagination import KeysetPage, KeysetPaginator
+
+FANOUT_LIMIT = getattr(settings, 'TIMELINE_FANOUT_LIMIT', 1000)
+BACKFILL = getattr(settings, 'TIMELINE_BACKFILL', 50)
+
+Membership = Account.groups.through
+
+
+def fan_out(post):
+    if Group.objects.filter(pk=post.group_id, member_count__gt=FANOUT_LIMIT).exists():
+        return 0
+    members = Membership.objects.filter(group_id=post.group_id).values_list('account_id', flat=True)
+    entries = [TimelineEntry(account_id=account_id, post_id=post.pk, group_id=post.group_id, date_pub=post.date_pub)
+               for account_id in members.iterator()]
+    TimelineEntry.objects.bulk_create(entries, batch_size=500, ignore_conflicts=True)
+    return len(entries)
+
+
+def backfill(account_ids, group_ids):
+    small = Group.objects.filter(pk__in=group_ids, member_count__lte=FANOUT_LIMIT).values_list('pk', flat=True)
+    entries = []
+    for group_id in small:
+        latest = Post.objects.filter(group_id=group_id).order_by('-date_pub', '-id').values_list('pk', 'date_pub')
+        for post_id, date_pub in latest[:BACKFILL]:
+            entries.extend(TimelineEntry(account_id=account_id, post_id=post_id, group_id=group_id, date_pub=date_pub)
+                           for account_id in account_ids)
+    TimelineEntry.objects.bulk_create(entries, batch_size=500, ignore_conflicts=True)
+
+
+def drop(account_ids, group_ids):
+    TimelineEntry.objects.filter(account_id__in=account_ids, group_id__in=group_ids).delete()
+
+
+class TimelinePaginator(KeysetPaginator):
+    """Goes only forward: ?page=first and ?after=<cursor>."""
+    def __init__(self, account, per_page):
+        super().__init__(Post.objects.none(), per_page)
+        self.account = account
+
+    def get_page(self, page=None, after=None, before=None):
+        if before or page not in (None, '', 'first', '1'):
+            raise Http404(u"The timeline has only the first page and ?after=.")
+        entries = TimelineEntry.objects.filter(account=self.account)
+        big = list(Group.objects.filter(owners=self.account, member_count__gt=FANOUT_LIMIT).values_list('pk', flat=True))
+        posts = Post.objects.filter(group_id__in=big)
+        if after:
+            value, pk = self.parse_cursor(after)
+            entries = entries.filter(Q(date_pub__lt=value) | Q(date_pub=value, post_id__lt=pk))
+            posts = posts.filter(Q(date_pub__lt=value) | Q(date_pub=value, pk__lt=pk))
+        # a page from each side: the top per_page + 1 of the merge are in the top per_page + 1 of their side
+        rows = set(entries.order_by('-date_pub', '-post_id').values_list('date_pub', 'post_id')[:self.per_page + 1])
+        if big: # the set also drops posts copied before the group grew over the limit
+            rows.update(posts.order_by('-date_pub', '-id').values_list('date_pub', 'id')[:self.per_page + 1])
+        rows = sorted(rows, reverse=True)[:self.per_page + 1]
+        ids = [post_id for date_pub, post_id in rows[:self.per_page]]
+        loaded = Post.objects.cards().in_bulk(ids)
+        return KeysetPage([loaded[pk] for pk in ids if pk in loaded], self, len(rows) > self.per_page, False)
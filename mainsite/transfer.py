@@ -0,0 +1,284 @@
+"""
+Moving the site between instances as JSONL: one object per line, {"type": ..., ...}.
+
+Objects refer to each other by natural keys(username, group and tag slugs), not by pks. The import
+keeps the map of these keys to the local pks in ImportedKey under the name of the source, so the
+export of one database can be imported into another that already has data: an imported object whose
+username or slug is taken gets a new one(username-2, a fresh generated slug) and the lines below
+that refer to it get the imported object, never the local one. Only tags are merged by slug. The
+types go in the order of TYPES, so the objects a line refers to are always above it.
+
+The export reads every table in pk order by chunks and keeps only one chunk in memory. The import
+inserts a chunk of lines with bulk_create in one transaction and can be resumed from the last
+committed line with --offset; the objects already imported from the source are skipped, so running
+it again from an earlier line is harmless. Photos are exported as file names only.
+"""
+import json
+from datetime import datetime
+
+from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+from django.utils.text import Truncator
+
+from . import search, timeline
+from .counters import rebuild_group_count, repair_group_counters
+from .models import Account, Group, ImportedKey, Post, Tag
+from .page_cache import purge_pages
+from .slugs import GROUP_SLUG_RE, advance_to, group_slugs, post_slugs, slug_number
+from .tags import rebuild_tag_counts
+
+TYPES = ('account', 'group', 'tag', 'membership', 'post')
+Membership = Account.groups.through
+PostTags = Post.tags.through
+
+
+class Encoder(DjangoJSONEncoder):
+    def default(self, o):
+        if isinstance(o, datetime): # DjangoJSONEncoder cuts to milliseconds, the cursors need microseconds
+            return o.isoformat()
+        return super().default(o)
+
+
+def pks_by(queryset, field, values, batch=500, pk='pk'):
+    """{value: pk} for objects inserted by bulk_create, which returns no pks on sqlite."""
+    values = list(values)
+    found = {}
+    for start in range(0, len(values), batch):
+        found.update(queryset.filter(**{field + '__in': values[start:start + batch]}).values_list(field, pk))
+    return found
+
+
+def chunks(queryset, chunk_size):
+    """Lists of objects in pk order, a range query per chunk instead of a growing OFFSET."""
+    last_pk = 0
+    while True:
+        chunk = list(queryset.filter(pk__gt=last_pk).order_by('pk')[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last_pk = chunk[-1].pk
+
+# ------------- export ----------------
+
+def export_accounts(chunk_size):
+    for chunk in chunks(Account.objects.select_related('user'), chunk_size):
+        for account in chunk:
+            user = account.user
+            yield {'username': user.username, 'password': user.password, 'email': user.email,
+                   'first_name': user.first_name, 'last_name': user.last_name, 'is_active': user.is_active,
+                   'date_joined': user.date_joined, 'age': account.age, 'views': account.views,
+                   'photo': account.photo.name}
+
+
+def export_groups(chunk_size):
+    for chunk in chunks(Group.objects.all(), chunk_size):
+        for group in chunk:
+            yield {'slug': group.slug, 'name': group.name, 'description': group.description,
+                   'photo': group.photo.name, 'date_create': group.date_create}
+
+
+def export_tags(chunk_size):
+    for chunk in chunks(Tag.objects.all(), chunk_size):
+        for tag in chunk:
+            yield {'slug': tag.slug, 'title': tag.title}
+
+
+def export_memberships(chunk_size):
+    rows = Membership.objects.values_list('account__user__username', 'group__slug')
+    for username, group in rows.order_by('pk').iterator(chunk_size=chunk_size):
+        yield {'username': username, 'group': group}
+
+
+def export_posts(chunk_size):
+    posts = Post.objects.select_related('author__user', 'group').only(
+        'slug', 'title', 'body', 'date_pub', 'author__user__username', 'group__slug')
+    for chunk in chunks(posts, chunk_size):
+        tags = {}
+        for post_id, slug in PostTags.objects.filter(post_id__in=[post.pk for post in chunk]).values_list(
+                'post_id', 'tag__slug'):
+            tags.setdefault(post_id, []).append(slug)
+        for post in chunk:
+            yield {'slug': post.slug, 'title': post.title, 'body': post.body, 'date_pub': post.date_pub,
+                   'author': post.author.user.username, 'group': post.group.slug, 'tags': tags.get(post.pk, [])}
+
+
+EXPORTERS = {'account': export_accounts, 'group': export_groups, 'tag': export_tags,
+             'membership': export_memberships, 'post': export_posts}
+
+
+def export(out, types=TYPES, chunk_size=2000):
+    """Writes the JSONL lines to the file out, returns the number of lines."""
+    count = 0
+    for kind in TYPES:
+        if kind not in types:
+            continue
+        for obj in EXPORTERS[kind](chunk_size):
+            obj['type'] = kind
+            out.write(json.dumps(obj, cls=Encoder, ensure_ascii=False) + '\n')
+            count += 1
+    return count
+
+# ------------- import ----------------
+
+def known(source, kind, keys):
+    """{source key: local pk} of the objects imported from the source before, see ImportedKey."""
+    return pks_by(ImportedKey.objects.filter(source=source, kind=kind), 'key', keys, pk='object_id')
+
+
+def remember(source, kind, pks):
+    ImportedKey.objects.bulk_create([ImportedKey(source=source, kind=kind, key=key, object_id=pk)
+                                     for key, pk in pks.items()])
+
+
+def free_username(username, taken):
+    """username-2, username-3... - the first one that is neither in the database nor in taken."""
+    User = get_user_model()
+    number = 2
+    while True:
+        name = '%s-%d' % (username[:140], number)
+        if name not in taken and not User.objects.filter(username=name).exists():
+            return name
+        number += 1
+
+
+def import_accounts(rows, source):
+    imported = known(source, 'account', [row['username'] for row in rows])
+    rows = [row for row in rows if row['username'] not in imported]
+    if not rows:
+        return
+    User = get_user_model()
+    taken = pks_by(User.objects.all(), 'username', [row['username'] for row in rows])
+    names = {}
+    for row in rows: # a local user with the same name is somebody else
+        username = row['username']
+        names[username] = free_username(username, names.values()) if username in taken else username
+    User.objects.bulk_create(
+        [User(username=names[row['username']], password=row['password'], email=row['email'].lower(),
+              first_name=row['first_name'], last_name=row['last_name'], is_active=row['is_active'],
+              date_joined=parse_datetime(row['date_joined'])) for row in rows])
+    users = pks_by(User.objects.all(), 'username', names.values())
+    Account.objects.bulk_create(
+        [Account(user_id=users[names[row['username']]], age=row['age'], views=row['views'], photo=row['photo'])
+         for row in rows])
+    accounts = pks_by(Account.objects.all(), 'user_id', users.values())
+    remember(source, 'account', {username: accounts[users[name]] for username, name in names.items()})
+
+
+def new_slugs(rows, taken, fresh):
+    """{source slug: local slug}, the taken ones are replaced by fresh(list of the rows of the taken)."""
+    conflicts = [row for row in rows if row['slug'] in taken]
+    slugs = {row['slug']: row['slug'] for row in rows}
+    slugs.update(zip([row['slug'] for row in conflicts], fresh(conflicts)))
+    return slugs
+
+
+def import_groups(rows, source):
+    imported = known(source, 'group', [row['slug'] for row in rows])
+    rows = [row for row in rows if row['slug'] not in imported]
+    if not rows:
+        return
+    generated = [slug_number(row['slug']) for row in rows if GROUP_SLUG_RE.match(row['slug'])]
+    if generated: # group_slugs() must not issue them again, neither below nor later
+        advance_to('group', max(generated))
+    taken = pks_by(Group.objects.all(), 'slug', [row['slug'] for row in rows])
+    slugs = new_slugs(rows, taken, lambda conflicts: group_slugs(len(conflicts)))
+    Group.objects.bulk_create(
+        [Group(slug=slugs[row['slug']], name=row['name'], description=row['description'], photo=row['photo'])
+         for row in rows])
+    groups = pks_by(Group.objects.all(), 'slug', slugs.values())
+    # date_create is auto_now_add, bulk_create has set it to now
+    Group.objects.bulk_update([Group(pk=groups[slugs[row['slug']]], date_create=parse_datetime(row['date_create']))
+                               for row in rows], ['date_create'])
+    remember(source, 'group', {slug: groups[new] for slug, new in slugs.items()})
+
+
+def import_tags(rows, source):
+    # a tag is its slug, the same slug here is the same tag
+    Tag.objects.bulk_create([Tag(slug=row['slug'], title=row['title']) for row in rows], ignore_conflicts=True)
+
+
+def import_memberships(rows, source):
+    accounts = known(source, 'account', {row['username'] for row in rows})
+    groups = known(source, 'group', {row['group'] for row in rows})
+    Membership.objects.bulk_create(
+        [Membership(account_id=accounts[row['username']], group_id=groups[row['group']]) for row in rows],
+        ignore_conflicts=True)
+
+
+def import_posts(rows, source):
+    imported = known(source, 'post', [row['slug'] for row in rows])
+    rows = [row for row in rows if row['slug'] not in imported]
+    if not rows:
+        return
+    advance_to('post', max(slug_number(row['slug']) for row in rows)) # post_slugs() must not issue them again
+    taken = pks_by(Post.objects.all(), 'slug', [row['slug'] for row in rows])
+    slugs = new_slugs(rows, taken, lambda conflicts: post_slugs([row['title'] for row in conflicts]))
+    accounts = known(source, 'account', {row['author'] for row in rows})
+    groups = known(source, 'group', {row['group'] for row in rows})
+    tags = pks_by(Tag.objects.all(), 'slug', {slug for row in rows for slug in row['tags']})
+    Post.objects.bulk_create(
+        [Post(slug=slugs[row['slug']], title=row['title'], body=row['body'],
+              excerpt=Truncator(row['body']).chars(700), body_html=Post.render_body(row['body']),
+              author_id=accounts[row['author']], group_id=groups[row['group']]) for row in rows])
+    posts = pks_by(Post.objects.all(), 'slug', slugs.values())
+    posts = {slug: posts[new] for slug, new in slugs.items()}
+    Post.objects.bulk_update([Post(pk=posts[row['slug']], date_pub=parse_datetime(row['date_pub'])) for row in rows],
+                             ['date_pub']) # auto_now_add, like date_create above
+    PostTags.objects.bulk_create(
+        [PostTags(post_id=posts[row['slug']], tag_id=tags[slug], date_pub=parse_datetime(row['date_pub']))
+         for row in rows for slug in row['tags']], ignore_conflicts=True)
+    remember(source, 'post', posts)
+
+
+IMPORTERS = {'account': import_accounts, 'group': import_groups, 'tag': import_tags,
+             'membership': import_memberships, 'post': import_posts}
+
+
+def import_chunk(lines, source):
+    rows = {}
+    for line in lines:
+        row = json.loads(line)
+        rows.setdefault(row.pop('type'), []).append(row)
+    with transaction.atomic():
+        for kind in TYPES: # the order of the dependencies
+            if kind in rows:
+                IMPORTERS[kind](rows[kind], source)
+
+
+def import_lines(lines, source='', offset=0, chunk_size=2000, progress=None):
+    """
+    Imports the JSONL lines starting with the line number offset(from 0). After every committed
+    chunk calls progress(number of the next line) - the offset to resume from. source names the
+    export, the objects imported from it are remembered under that name.
+    """
+    chunk = []
+    number = 0
+    for number, line in enumerate(lines, 1):
+        if number <= offset or not line.strip():
+            continue
+        chunk.append(line)
+        if len(chunk) == chunk_size:
+            import_chunk(chunk, source)
+            chunk = []
+            if progress:
+                progress(number)
+    if chunk:
+        import_chunk(chunk, source)
+        if progress:
+            progress(number)
+    return number
+
+
+def rebuild_derived():
+    """Everything that the signals keep up to date and bulk inserts leave behind."""
+    repair_group_counters()
+    rebuild_group_count()
+    rebuild_tag_counts()
+    for group_id in Group.objects.values_list('pk', flat=True).iterator():
+        members = list(Membership.objects.filter(group_id=group_id).values_list('account_id', flat=True))
+        if members:
+            timeline.backfill(members, [group_id])
+    search.rebuild_index()
+    purge_pages()
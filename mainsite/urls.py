@@ -4,12 +4,14 @@ from .views import *
 urlpatterns = [
     # ----- posts ----------------
     path('group/<str:slug>/post/create/', PostCreate.as_view(), name='post_create'),
-    path('group/<str:slug>/post/<str:postslug>/', PostView.as_view(), name='post_detail'),
+    path('post/<str:postslug>/', PostView.as_view(), name='post_detail'),
+    path('group/<str:slug>/post/<str:postslug>/', post_redirect, name='post_redirect'),
     # ----- groups --------------
     path('group/list/', GroupList.as_view(), name='group_list'),
     path('group/create/', GroupCreate.as_view(), name='group_create'),
     path('group/<str:slug>/join/', group_join, name='group_join'),
     path('group/<str:slug>/left/', group_left, name='group_left'),
+    path('group/<str:slug>/members/', group_members, name='group_members'),
     path('group/<str:slug>/delete/', GroupDelete.as_view(), name='group_delete'),
     path('group/<str:slug>/update/', GroupUpdate.as_view(), name='group_update'),
     path('group/<str:slug>/', GroupView.as_view(), name='group_info'),
@@ -17,9 +19,18 @@ urlpatterns = [
     path('profile/edit/', ProfileEdit.as_view(), name='profile_edit'),
     path('profile/', ProfileInfo.as_view(), name='myprofile'),
     path('profile/<int:pk>/', ProfileInfo.as_view(), name='profile'),
+    path('profile/<int:pk>/groups/', profile_groups, name='profile_groups'),
     path('reg/', SignUp.as_view(), name='reg'),
     path('login/', Login.as_view(), name='login'),
     path('logout/', logoutview, name='logout'),
+    # ------ tags --------
+    path('tag/', TagList.as_view(), name='tag_list'),
+    path('tag/<str:tagslug>/', TagView.as_view(), name='tag_detail'),
+    # ------ search --------
+    path('search/', SearchView.as_view(), name='search'),
+    # ------ stats --------
+    path('stats/fragments/', fragment_stats_view, name='fragment_stats'),
+    path('metrics', metrics_view, name='metrics'),
     # ---------------
     path('', MainView.as_view(), name='main'),
 ]
\ No newline at end of file
@@ -1,16 +1,31 @@
 from django.shortcuts import render, redirect, reverse, get_object_or_404
 from django.urls import reverse_lazy
-from django.http import Http404
+from django.utils.http import urlencode
+from django.utils.crypto import constant_time_compare
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse
+from django.db.models import Max
 # --------- Views --------------------
 from django.views.generic import View, DetailView, ListView
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
-from .mixins import OwnerCheck
+from .mixins import OwnerCheck, FirstLastPagination, AnonymousPageCache
+from .pagination import EPOCH, KeysetPaginator
+from .search import search, load_results
+from .fragments import fragment_stats
+from .metrics import render_prometheus
+from .membership import is_member
+from .members import groups_page, members_page
+from .assets import media_url
+from .timeline import TimelinePaginator
+from .slugs import canonical
+from .tags import TagPaginator, tag_cloud
 # -------------------------------------
 from django.contrib.auth import login, logout # authenticate
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.models import User
-from .models import Group, Post
+from .models import Account, Group, Post, Tag, TagCount
 from .forms import (
     UserCreationForm,
     UserEditForm,
@@ -21,9 +36,17 @@ from .forms import (
     )
 
 
+TAG_COLORS = ('primary', 'secondary', 'success', 'danger', 'warning', 'info', 'dark')
+
 class MainView(View):
+    paginate_by = 20
     def get(self, request):
-        return render(request, 'index.html')
+        if not request.user.is_authenticated:
+            return render(request, 'index.html')
+        page = TimelinePaginator(request.user.account, self.paginate_by).get_page(
+            page=request.GET.get('page'), after=request.GET.get('after'))
+        context = {'page_obj': page, 'posts': page.object_list, 'colors': TAG_COLORS}
+        return render(request, 'mainsite/timeline.html', context=context)
 #------------- profile -------------------
 class SignUp(View):
     def dispatch(self, request, *args, **kwargs):
@@ -75,6 +98,7 @@ class ProfileInfo(LoginRequiredMixin, DetailView):
     login_url = '/login/' 
     model = User
     template_name = 'mainsite/profileinfo.html'
+    template_engine = settings.HOT_PAGES_TEMPLATE_ENGINE
     def get_object(self):
         try:
             object = super().get_object()
@@ -101,37 +125,61 @@ class ProfileEdit(LoginRequiredMixin, View):
 
 # ---------- group ----------------------
 
-class GroupList(ListView):
+class GroupList(AnonymousPageCache, FirstLastPagination, ListView):
     allow_empty = True
     model = Group
     paginate_by = 5
     context_object_name = 'groups'
     template_name = 'mainsite/group_list.html'
-    def paginate_queryset(self, queryset, page_size):
-        paginator = self.get_paginator(queryset, page_size, allow_empty_first_page=self.get_allow_empty())
-        page = self.request.GET.get('page') or 1
-        try:
-            page_number = int(page)
-        except ValueError:
-            if page == 'last':
-                page_number = paginator.num_pages
-            elif page == 'first':
-                page_number = 1
-            else:
-                raise Http404(u"Page is not 'last' or 'first', nor can it be converted to an int.")
-        page = paginator.get_page(page_number) # get_page исключает ошибки, вместо просто page()
-        return (paginator, page, page.object_list, page.has_other_pages())
-
-class GroupView(DetailView):
+    sort_modes = ( # ?sort= -> (title, ordering), all backed by indexes
+        ('new', u'Новые', ('-date_create',)),
+        ('popular', u'Популярные', ('-member_count', '-date_create')),
+        ('active', u'Активные', ('-last_post_at', '-date_create')),
+    )
+    def get_last_modified(self):
+        return Group.objects.aggregate(last=Max('updated_at'))['last'] or EPOCH
+    def get_sort(self):
+        sort = self.request.GET.get('sort')
+        return sort if sort in [mode for mode, title, ordering in self.sort_modes] else 'new'
+    def get_ordering(self):
+        return dict((mode, ordering) for mode, title, ordering in self.sort_modes)[self.get_sort()]
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['sort'] = self.get_sort()
+        context['sort_modes'] = [(mode, title) for mode, title, ordering in self.sort_modes]
+        context['page_query'] = '&sort=' + context['sort']
+        return context
+
+class GroupView(AnonymousPageCache, DetailView):
     # allow_empty = True <-- зачем она???
     model = Group
+    paginate_by = 10
     template_name = 'mainsite/group_info.html'
+    def get_last_modified(self): # posts, members and tags of the group touch its updated_at
+        return Group.objects.filter(slug=canonical(self.kwargs.get('slug'))).values_list('updated_at', flat=True).first()
+    template_engine = settings.HOT_PAGES_TEMPLATE_ENGINE
     def get_context_data(self, **kwargs):
         context = super().get_context_data()
-        context['posts'] = Post.objects.filter(group=context['object'])
-        context['colors'] = ('primary', 'secondary', 'success', 'danger', 'warning', 'info', 'dark')
+        context.update(group_feed_context(self.request, context['object'], self.paginate_by))
         return context
 
+def group_feed_context(request, group, per_page):
+    # the page of the group without the object itself, bench_templates renders it with both engines
+    paginator = KeysetPaginator(Post.objects.filter(group=group).cards(), per_page)
+    page = paginator.get_page(
+        page=request.GET.get('page'),
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    return {
+        'page_obj': page,
+        'is_paginated': page.has_other_pages(),
+        'posts': page.object_list,
+        'is_member': is_member(request, group),
+        'colors': TAG_COLORS,
+        'tag_cloud': tag_cloud(group),
+    }
+
 class GroupCreate(LoginRequiredMixin, CreateView):
     login_url = 'login'
     form_class = GroupForm
@@ -148,8 +196,7 @@ class GroupUpdate(LoginRequiredMixin, OwnerCheck, UpdateView):
     template_name = 'mainsite/group_edit.html'
 
     def form_valid(self, form):
-        obj = form.save() # FIXME if we save default slug(with dot simbols), will be raised a error!!!
-        print('kek')
+        obj = form.save()
         return redirect(obj)
 
 class GroupDelete(LoginRequiredMixin, OwnerCheck, DeleteView):
@@ -168,26 +215,115 @@ class PostCreate(LoginRequiredMixin, OwnerCheck, CreateView):
         obj = form.save(author=self.request.user.account, group=self.group)
         return redirect(obj) # TODO: redirect to post absolute url
 
-class PostView(DetailView):
+class PostView(AnonymousPageCache, DetailView):
     model = Post
     template_name = 'mainsite/post_detail.html'
-    def get_queryset(self):
-        group = get_object_or_404(Group, slug__iexact=self.kwargs.get('slug'))
-        return Post.objects.filter(group=group)
+    template_engine = settings.HOT_PAGES_TEMPLATE_ENGINE
+    slug_url_kwarg = 'postslug'
+    def get_last_modified(self): # the page shows the group and the author names too
+        versions = Post.objects.filter(slug=canonical(self.kwargs['postslug'])).values_list(
+            'updated_at', 'group__updated_at', 'author__updated_at').first()
+        return max(versions) if versions else None
+    def get_queryset(self): # post, group and author in one join, tags in one more query
+        return Post.objects.select_related('group', 'author__user').prefetch_related('tags')
     def get_object(self):
-        return get_object_or_404(self.get_queryset(), slug__iexact=self.kwargs.get('postslug'))
-""" Крч, сверху почти говнокод. Я сделал чтобы ссылка на пост содержал слаг группы, но можно сделать тупо ссылку без
-слага группы и кода меньше, и юзабилити сайта повысится
-я даун("""
+        return get_object_or_404(self.get_queryset(), slug=canonical(self.kwargs['postslug']))
+
+def post_redirect(request, slug, postslug): # old group/<slug>/post/<postslug>/ links
+    # post slugs are unique on their own, so the group part is not needed for the lookup
+    postslug = Post.objects.filter(slug=canonical(postslug)).values_list('slug', flat=True).first()
+    if postslug is None:
+        raise Http404(u"No post found.")
+    return redirect('post_detail', postslug=postslug, permanent=True)
+
+# ------------- tags ----------------------
+
+class TagList(View):
+    def get(self, request):
+        return render(request, 'mainsite/tag_list.html', context={'tag_cloud': tag_cloud(size=200)})
+
+class TagView(DetailView):
+    model = Tag
+    paginate_by = 10
+    slug_url_kwarg = 'tagslug'
+    template_name = 'mainsite/tag_detail.html'
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data()
+        page = TagPaginator(context['object'], self.paginate_by).get_page(
+            page=self.request.GET.get('page'),
+            after=self.request.GET.get('after'),
+            before=self.request.GET.get('before'),
+        )
+        context['page_obj'] = page
+        context['is_paginated'] = page.has_other_pages()
+        context['posts'] = page.object_list
+        context['post_count'] = TagCount.objects.filter(tag=context['object'], group=None).values_list(
+            'count', flat=True).first() or 0
+        context['tag_cloud'] = tag_cloud()
+        context['colors'] = TAG_COLORS
+        return context
+
+# ------------- search ----------------------
+
+class SearchView(FirstLastPagination, ListView):
+    allow_empty = True
+    paginate_by = 10
+    context_object_name = 'results'
+    template_name = 'mainsite/search.html'
+    def get_queryset(self): # ranked (kind, pk) pairs, objects are loaded only for the current page
+        self.search_query = self.request.GET.get('search', '').strip()
+        return search(self.search_query)
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['results'] = load_results(context['page_obj'].object_list)
+        context['search_query'] = self.search_query
+        context['page_query'] = '&' + urlencode({'search': self.search_query})
+        return context
 
 @login_required(login_url='login')
 def group_join(request, slug):
-    group = get_object_or_404(Group, slug__iexact=slug)
+    group = get_object_or_404(Group, slug=canonical(slug))
     group.owners.add(request.user.account)
     return redirect(group)
 
 @login_required(login_url='login')
 def group_left(request, slug):
-    group = get_object_or_404(Group, slug__iexact=slug)
+    group = get_object_or_404(Group, slug=canonical(slug))
     group.owners.remove(request.user.account)
-    return redirect(group)
\ No newline at end of file
+    return redirect(group)
+
+def wants_json(request):
+    return request.GET.get('format') == 'json' or 'application/json' in request.META.get('HTTP_ACCEPT', '')
+
+def group_members(request, slug): # the next members of the group header, see members.py
+    group = get_object_or_404(Group.objects.only('slug'), slug=canonical(slug))
+    page = members_page(group, request.GET.get('after'))
+    if wants_json(request):
+        return JsonResponse({'next': page.next, 'members': [
+            {'name': account.user.first_name, 'url': reverse('profile', kwargs={'pk': account.user_id}),
+             'photo': media_url(account.photo.name)} for account in page.objects]})
+    return render(request, 'includes/member_list.html', context={'page': page})
+
+@login_required(login_url='login')
+def profile_groups(request, pk): # the next groups of the profile card
+    account = get_object_or_404(Account.objects.only('user_id'), user_id=pk)
+    page = groups_page(account, request.GET.get('after'))
+    if wants_json(request):
+        return JsonResponse({'next': page.next, 'groups': [
+            {'name': group.name, 'url': group.get_absolute_url()} for group in page.objects]})
+    return render(request, 'includes/group_links.html', context={'page': page})
+
+@staff_member_required
+def fragment_stats_view(request):
+    return JsonResponse(fragment_stats())
+
+def metrics_token_ok(request):
+    token = settings.METRICS_TOKEN
+    return bool(token) and constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), 'Bearer ' + token)
+
+def metrics_view(request): # scraped by prometheus with the bearer token
+    if not settings.METRICS_ENABLED:
+        raise Http404(u"Metrics are off.")
+    if not request.user.is_staff and not metrics_token_ok(request):
+        raise Http404
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
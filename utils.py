@@ -1,12 +1,49 @@
 # --------------------- genslug ---------------------
+import unicodedata
+from functools import lru_cache
+
 from django.utils.text import slugify as django_slugify
 alphabet = {'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo', 'ж': 'zh', 'з': 'z', 'и': 'i',
             'й': 'j', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't',
             'у': 'u', 'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shch', 'ы': 'i', 'э': 'e', 'ю': 'yu',
-            'я': 'ya'}
+            'я': 'ya',
+            'ь': '', 'ъ': '', # used to stay in the slugs as they are
+            'і': 'i', 'ї': 'yi', 'є': 'ye', 'ґ': 'g', 'ў': 'u'} # ukrainian, belarusian
+SLUG_CACHE_MAX_LENGTH = 100 # titles and tags are cached, long texts(post bodies for the search) are not
+
+
+class TranslitTable(dict):
+    """
+    str.translate() table: the alphabet in both cases, any other character is looked up once and
+    remembered - latin letters lose their accents('é' -> 'e', 'ﬁ' -> 'fi'), the rest stays as it is.
+    """
+    def __missing__(self, code):
+        char = chr(code)
+        latin = ''.join(c for c in unicodedata.normalize('NFKD', char) if not unicodedata.combining(c))
+        value = latin if latin and latin.isascii() else char
+        self[code] = value
+        return value
+
+
+translit_table = TranslitTable({ord(k): v for letter, v in alphabet.items() for k in (letter, letter.upper())})
+
+
+def _slugify(s):
+    return django_slugify(s.translate(translit_table), allow_unicode=True)
+
+
+_cached_slugify = lru_cache(maxsize=4096)(_slugify)
+
+
 def slugify(s):
-    return django_slugify(''.join(alphabet.get(w, w) for w in s.lower()), allow_unicode=True)
+    return _cached_slugify(s) if len(s) <= SLUG_CACHE_MAX_LENGTH else _slugify(s)
+
+
+def slugify_many(strings):
+    """slugify() of every string, each distinct string is transliterated once."""
+    slugs = {s: slugify(s) for s in set(strings)}
+    return [slugs[s] for s in strings]
 # ----------------------------------------------------------
 
 
-# -----------------------------------------------------------
\ No newline at end of file
+# -----------------------------------------------------------
@@ -41,6 +41,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'mainsite.middleware.AssetsMiddleware', # /static/ and /uploads/, see mainsite/assets.py
+    'mainsite.middleware.MetricsMiddleware', # drops out unless METRICS_ENABLED
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -70,19 +72,112 @@ TEMPLATES = [
     },
 ]
 
+# TEMPLATE_CACHE=1 keeps the compiled templates in memory(django does it by itself only with
+# DEBUG off) and vkommune/wsgi.py compiles all of them before the first request, see
+# mainsite/template_warmup.py. A changed template needs a restart then.
+TEMPLATE_CACHE = os.environ.get('TEMPLATE_CACHE', '0' if DEBUG else '1') == '1'
+if TEMPLATE_CACHE:
+    TEMPLATES[0]['APP_DIRS'] = False # the loaders below replace it
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
+# JINJA2=1 renders the hottest pages(group, post, profile) with jinja2(pip install jinja2, it is
+# not in requirements.txt) from the copies of their templates in jinja2/, everything else stays
+# on the django templates. python manage.py bench_templates compares the two.
+HOT_PAGES_TEMPLATE_ENGINE = None # the first engine, django
+if os.environ.get('JINJA2') == '1':
+    TEMPLATES.append({
+        'BACKEND': 'django.template.backends.jinja2.Jinja2',
+        'NAME': 'jinja2',
+        'DIRS': [os.path.join(BASE_DIR, 'jinja2')],
+        'APP_DIRS': False,
+        'OPTIONS': {
+            'environment': 'mainsite.jinja2.environment',
+            'context_processors': ["my_context_processors.menu.main"],
+        },
+    })
+    HOT_PAGES_TEMPLATE_ENGINE = 'jinja2'
+
 WSGI_APPLICATION = 'vkommune.wsgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
-DATABASES = {
+# The profile is picked by DB_PROFILE: 'sqlite'(default) or 'postgres'.
+
+DB_PROFILE = os.environ.get('DB_PROFILE', 'sqlite')
+
+if DB_PROFILE == 'postgres':
+    # needs psycopg2. DB_PORT defaults to pgbouncer: it pools the server connections, the
+    # workers keep theirs to pgbouncer for CONN_MAX_AGE seconds instead of one per request.
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'vkommune'),
+            'USER': os.environ.get('DB_USER', 'vkommune'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', '127.0.0.1'),
+            'PORT': os.environ.get('DB_PORT', '6432'),
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            'DISABLE_SERVER_SIDE_CURSORS': True, # pgbouncer in transaction mode can't keep them
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', os.path.join(BASE_DIR, 'db.sqlite3')),
+        }
+    }
+
+# set on every new sqlite connection, see mainsite/database.py. WAL lets the readers go on
+# while one writer commits, busy_timeout makes writers wait for each other instead of failing.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal', # safe with WAL, only the last commits may be lost on power failure
+    'mmap_size': 256 * 1024 * 1024,
+    'busy_timeout': 5000, # ms
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+# locmem by default, any other backend can be plugged in from the environment, e.g.
+# CACHE_BACKEND=django.core.cache.backends.memcached.MemcachedCache CACHE_LOCATION=127.0.0.1:11211
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'vkommune'),
     }
 }
 
+# CACHE_TIER=1 keeps sessions and request.user(with its Account) in the cache above, see
+# mainsite/middleware.py. With locmem every process has its own copy, so run it on a shared
+# backend(memcached, redis) when there is more than one worker.
+if os.environ.get('CACHE_TIER') == '1':
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+    MIDDLEWARE[MIDDLEWARE.index('django.contrib.auth.middleware.AuthenticationMiddleware')] = \
+        'mainsite.middleware.CachedAuthenticationMiddleware'
+
+
+# Request metrics(see mainsite/metrics.py): METRICS=1 turns them on, METRICS_SAMPLE_RATE=0.1
+# measures every tenth request. /metrics answers staff and 'Authorization: Bearer <METRICS_TOKEN>'
+# (prometheus' bearer_token), never by the address: behind the proxy every request comes from it.
+
+METRICS_ENABLED = os.environ.get('METRICS') == '1'
+METRICS_SAMPLE_RATE = float(os.environ.get('METRICS_SAMPLE_RATE', 1))
+METRICS_SERVER_TIMING = True
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '') # empty - staff only
+if METRICS_ENABLED:
+    TEMPLATES[0]['BACKEND'] = 'mainsite.metrics.TimedDjangoTemplates'
+
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -127,5 +222,18 @@ STATIC_URL = '/static/'
 # STATICFILES_DIRS = [
 #         os.path.join(BASE_DIR, 'static'),
 #    ]
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+
+# STATIC_MANIFEST=1(default with DEBUG off): collectstatic names the files by their content hash
+# and writes .gz(and .br with pip install brotli) copies next to them. Without the manifest
+# {% static %} gives the plain names.
+STATIC_MANIFEST = os.environ.get('STATIC_MANIFEST', '0' if DEBUG else '1') == '1'
+if STATIC_MANIFEST:
+    STATICFILES_STORAGE = 'mainsite.storage.CompressedManifestStaticFilesStorage'
+
+# SERVE_ASSETS=0 when nginx serves STATIC_ROOT and MEDIA_ROOT itself. Hashed names are cached
+# for a year, the rest for ASSETS_MAX_AGE seconds and then revalidated by ETag.
+SERVE_ASSETS = os.environ.get('SERVE_ASSETS', '1') == '1'
+ASSETS_MAX_AGE = 60 * 60
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
\ No newline at end of file
@@ -15,10 +15,8 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from django.conf import settings # added
-from django.conf.urls.static import static # added
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('mainsite.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT) # added to upload
+] # static files and uploads are served by mainsite.middleware.AssetsMiddleware
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'vkommune.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings
+
+if settings.TEMPLATE_CACHE:
+    from mainsite.template_warmup import warm_up
+    warm_up()